@@ -40,32 +40,158 @@ PY_PATTERN = re.compile(
             \s*\#(?:[^\r\n])*               # single line comments
         )
       | (?P<code>
-            "{3}(?:\\.|[^\\])*"{3}          # triple double quotes
-          | '{3}(?:\\.|[^\\])*'{3}          # triple single quotes
+            "{3}(?:\\.|[^\\])*?"{3}         # triple double quotes
+          | '{3}(?:\\.|[^\\])*?'{3}         # triple single quotes
           | "(?:\\.|[^"\\])*"               # double quotes
-          | '(?:\\.|[^'])*'                 # single quotes
+          | '(?:\\.|[^'\\])*'               # single quotes
           | .[^\#"']*                       # everything else
         )
     ''',
     re.DOTALL
 )
 
+# Open tokens at the end of the text that more text could still change. Token bodies are matched atomically
+# (`(?=(?P<body>...))(?P=body)`) so that closed tokens fail without backtracking through their whole body.
+CSS_TAIL = re.compile(
+    r'''(?x)
+        /\*(?=(?P<ml>[^*]*(?:\*+[^*/][^*]*)*))(?P=ml)\**\Z      # unterminated multi-line comments
+      | /\Z                                                   # possible start of a comment
+      | "(?=(?P<dq>[^"\\]*(?:\\.[^"\\]*)*))(?P=dq)\\?\Z         # unterminated double quotes
+      | '(?=(?P<sq>[^'\\]*(?:\\.[^'\\]*)*))(?P=sq)\\?\Z         # unterminated single quotes
+    ''',
+    re.DOTALL
+)
+CPP_TAIL = re.compile(
+    r'''(?x)
+        /\*(?=(?P<ml>[^*]*(?:\*+[^*/][^*]*)*))(?P=ml)\**\Z      # unterminated multi-line comments
+      | \s*/?\Z                                               # possible start of a comment
+      | "(?=(?P<dq>[^"\\]*(?:\\.[^"\\]*)*))(?P=dq)\\?\Z         # unterminated double quotes
+      | '(?=(?P<sq>[^'\\]*(?:\\.[^'\\]*)*))(?P=sq)\\?\Z         # unterminated single quotes
+    ''',
+    re.DOTALL
+)
+PY_TAIL = re.compile(
+    r'''(?x)
+        \s*\Z                                                 # possible start of a comment
+      | "{3}(?=(?P<tdq>[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*))(?P=tdq)\\?\Z  # unterminated triple quotes
+      | '{3}(?=(?P<tsq>[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*))(?P=tsq)\\?\Z
+      | "{2}\Z                                                # possible start of triple quotes
+      | '{2}\Z
+      | "(?=(?P<dq>[^"\\]*(?:\\.[^"\\]*)*))(?P=dq)\\?\Z         # unterminated double quotes
+      | '(?=(?P<sq>[^'\\]*(?:\\.[^'\\]*)*))(?P=sq)\\?\Z         # unterminated single quotes
+    ''',
+    re.DOTALL
+)
+
+# Open tokens that streaming holds back: `(opener, scan, terminator)`. While a held token is open, only new text is
+# scanned for its end. Text the scan stops at is either the terminator or too short to tell, like a trailing `*` of a
+# multi-line comment or a trailing backslash in a string, and is scanned again with the next chunk.
+RE_ANY = re.compile(r'[\s\S]')
+RE_DOUBLE_QUOTED = (re.compile(r'"'), re.compile(r'[^"\\]*(?:\\[\s\S][^"\\]*)*'), re.compile(r'"'))
+RE_SINGLE_QUOTED = (re.compile(r"'"), re.compile(r"[^'\\]*(?:\\[\s\S][^'\\]*)*"), re.compile(r"'"))
+RE_MULTI_LINE_COMMENT = (re.compile(r'/\*'), re.compile(r'[^*]*(?:\*+[^*/][^*]*)*'), re.compile(r'\*+/'))
+CSS_OPEN = (
+    RE_MULTI_LINE_COMMENT,
+    RE_DOUBLE_QUOTED,
+    RE_SINGLE_QUOTED,
+    (re.compile(r'[^/"\']|/(?=[^*])'), re.compile(r'[^/"\']*'), RE_ANY)  # everything else
+)
+CPP_OPEN = (
+    RE_MULTI_LINE_COMMENT,
+    (re.compile(r'\s*//'), re.compile(r'[^\r\n]*'), RE_ANY),  # single line comments
+    RE_DOUBLE_QUOTED,
+    RE_SINGLE_QUOTED,
+    (re.compile(r'(?=\s)'), re.compile(r'\s*'), re.compile(r'[^\s/]|/[\s\S]')),  # white space before a comment
+    (re.compile(r'[^/"\']|/(?=[^/*])'), re.compile(r'[^/"\']*'), RE_ANY)  # everything else
+)
+PY_OPEN = (
+    (re.compile(r'\s*\#'), re.compile(r'[^\r\n]*'), RE_ANY),  # single line comments
+    (re.compile(r'"{3}'), re.compile(r'(?:[^"\\]|\\[\s\S]|"(?=[^"])|""(?=[^"]))*'), re.compile(r'"{3}')),
+    (re.compile(r"'{3}"), re.compile(r"(?:[^'\\]|\\[\s\S]|'(?=[^'])|''(?=[^']))*"), re.compile(r"'{3}")),
+    RE_DOUBLE_QUOTED,
+    RE_SINGLE_QUOTED,
+    (re.compile(r'(?=\s)'), re.compile(r'\s*'), RE_ANY),  # white space before a comment
+    (re.compile(r'[^\#"\']'), re.compile(r'[^\#"\']*'), RE_ANY)  # everything else
+)
 
-def _strip_regex(pattern, text, preserve_lines):
-    """Generic function that strips out comments pased on the given pattern."""
 
-    def remove_comments(group, preserve_lines=False):
-        """Remove comments."""
+def _remove_comments(group, preserve_lines=False):
+    """Remove comments."""
+
+    return ''.join([x[0] for x in LINE_PRESERVE.findall(group)]) if preserve_lines else ''
+
 
-        return ''.join([x[0] for x in LINE_PRESERVE.findall(group)]) if preserve_lines else ''
+def _evaluate(m, preserve_lines):
+    """Search for comments."""
 
-    def evaluate(m, preserve_lines):
-        """Search for comments."""
+    g = m.groupdict()
+    return g["code"] if g["code"] is not None else _remove_comments(g["comments"], preserve_lines)
 
-        g = m.groupdict()
-        return g["code"] if g["code"] is not None else remove_comments(g["comments"], preserve_lines)
 
-    return ''.join(map(lambda m: evaluate(m, preserve_lines), pattern.finditer(text)))
+def _strip_regex(pattern, text, preserve_lines):
+    """Generic function that strips out comments pased on the given pattern."""
+
+    return ''.join(map(lambda m: _evaluate(m, preserve_lines), pattern.finditer(text)))
+
+
+def _open_token(kinds, text):
+    """Get the kind of the open token the held text starts with, and the undecided text at its end."""
+
+    for kind in kinds:
+        m = kind[0].match(text)
+        if m is None:
+            continue
+        end = kind[1].match(text, m.end()).end()
+        if end == len(text):
+            return kind, ''
+        if not kind[2].match(text, end):
+            return kind, text[end:]
+    return None, None
+
+
+def _iter_strip_regex(pattern, tail, kinds, chunks, preserve_lines):
+    """
+    Generic generator that strips out comments from text chunks based on the given pattern.
+
+    Tokens are only output once more text can't change them: a token that reaches the end of
+    the text read so far, or that starts an open comment or string (`tail`), is held back with
+    everything after it. While the held token is still open (`kinds`), new chunks are only
+    scanned for its end instead of tokenizing the held text again.
+    """
+
+    held = []
+    kind = carry = None
+    for chunk in chunks:
+        if not chunk:
+            continue
+        held.append(chunk)
+        if kind is not None:
+            text = carry + chunk
+            end = kind[1].match(text).end()
+            if end == len(text):
+                carry = ''
+                continue
+            if not kind[2].match(text, end):
+                carry = text[end:]
+                continue
+
+        buffer = ''.join(held)
+        size = len(buffer)
+        out = []
+        pos = 0
+        for m in pattern.finditer(buffer):
+            if m.end() == size or tail.match(buffer, m.start()):
+                break
+            out.append(_evaluate(m, preserve_lines))
+            pos = m.end()
+        if pos:
+            buffer = buffer[pos:]
+            yield ''.join(out)
+        held = [buffer]
+        kind, carry = _open_token(kinds, buffer)
+
+    if held:
+        yield _strip_regex(pattern, ''.join(held), preserve_lines)
 
 
 @staticmethod
@@ -79,6 +205,19 @@ def _cpp(text, preserve_lines=False):
     )
 
 
+@staticmethod
+def _iter_cpp(chunks, preserve_lines=False):
+    """C/C++ style streaming comment stripper."""
+
+    return _iter_strip_regex(
+        CPP_PATTERN,
+        CPP_TAIL,
+        CPP_OPEN,
+        chunks,
+        preserve_lines
+    )
+
+
 @staticmethod
 def _python(text, preserve_lines=False):
     """Python style comment stripper."""
@@ -90,6 +229,19 @@ def _python(text, preserve_lines=False):
     )
 
 
+@staticmethod
+def _iter_python(chunks, preserve_lines=False):
+    """Python style streaming comment stripper."""
+
+    return _iter_strip_regex(
+        PY_PATTERN,
+        PY_TAIL,
+        PY_OPEN,
+        chunks,
+        preserve_lines
+    )
+
+
 @staticmethod
 def _css(text, preserve_lines=False):
     """CSS style comment stripper."""
@@ -101,6 +253,19 @@ def _css(text, preserve_lines=False):
     )
 
 
+@staticmethod
+def _iter_css(chunks, preserve_lines=False):
+    """CSS style streaming comment stripper."""
+
+    return _iter_strip_regex(
+        CSS_PATTERN,
+        CSS_TAIL,
+        CSS_OPEN,
+        chunks,
+        preserve_lines
+    )
+
+
 class CommentException(Exception):
     """Comment exception."""
 
@@ -124,14 +289,17 @@ class Comments(object):
         """Initialize."""
 
         self.preserve_lines = preserve_lines
+        self.style = style
         self.call = self.__get_style(style)
 
     @classmethod
-    def add_style(cls, style, fn):
-        """Add comment style."""
+    def add_style(cls, style, fn, iter_fn=None):
+        """Add comment style, and optionally its streaming stripper."""
 
         if style not in cls.__dict__:
             setattr(cls, style, fn)
+            if iter_fn is not None:
+                setattr(cls, 'iter_' + style, iter_fn)
             cls.styles.append(style)
 
     def __get_style(self, style):
@@ -147,9 +315,22 @@ class Comments(object):
 
         return self.call(text, self.preserve_lines)
 
+    def iter_strip(self, chunks):
+        """
+        Strip comments from an iterable of text chunks, yielding the stripped text in pieces.
+
+        Comments and strings may span chunks. The joined output is the same as `strip` of the
+        joined chunks, but text is only held back while more text could still change it.
+        """
+
+        iter_fn = getattr(self, 'iter_' + self.style, None)
+        if iter_fn is None:
+            raise CommentException(self.style)
+        return iter_fn(chunks, self.preserve_lines)
+
 
-Comments.add_style("c", _cpp)
-Comments.add_style("json", _cpp)
-Comments.add_style("cpp", _cpp)
-Comments.add_style("python", _python)
-Comments.add_style("css", _css)
+Comments.add_style("c", _cpp, _iter_cpp)
+Comments.add_style("json", _cpp, _iter_cpp)
+Comments.add_style("cpp", _cpp, _iter_cpp)
+Comments.add_style("python", _python, _iter_python)
+Comments.add_style("css", _css, _iter_css)
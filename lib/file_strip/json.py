@@ -6,7 +6,7 @@ Licensed under MIT
 Copyright (c) 2012 - 2016 Isaac Muse <isaacmuse@gmail.com>
 """
 import re
-from .comments import Comments
+from .comments import Comments, LINE_PRESERVE
 
 JSON_PATTERN = re.compile(
     r'''(?x)
@@ -31,6 +31,26 @@ JSON_PATTERN = re.compile(
     re.DOTALL
 )
 
+# Tokens that `sanitize_json` acts on, everything between them is copied as is
+SANITIZE_PATTERN = re.compile(
+    r'''(?x)
+        (?P<string>
+            "(?:\\.|[^"\\])*"            # double quoted string
+          | '(?:\\.|[^'\\])*'            # single quoted string
+        )
+      | (?P<block>
+            /\*[^*]*\*+(?:[^/*][^*]*\*+)*/  # multi-line comments
+        )
+      | (?P<line>
+            //[^\r\n]*                     # single line comments
+        )
+      | (?P<comma>,)                    # comma (possibly dangling)
+    ''',
+    re.DOTALL
+)
+WHITE_SPACE = re.compile(r'\s*')
+CLOSING_BRACKET = re.compile(r'[\s\r\n]*[\]}]')
+
 
 def strip_dangling_commas(text, preserve_lines=False):
     """Strip dangling commas."""
@@ -65,7 +85,71 @@ def strip_comments(text, preserve_lines=False):
     return Comments('json', preserve_lines).strip(text)
 
 
+def iter_strip_comments(chunks, preserve_lines=False):
+    """Strip JavaScript like comments from an iterable of text chunks, yielding the stripped text in pieces."""
+
+    return Comments('json', preserve_lines).iter_strip(chunks)
+
+
 def sanitize_json(text, preserve_lines=False):
-    """Sanitize the JSON file by removing comments and dangling commas."""
+    """
+    Sanitize the JSON file by removing comments and dangling commas.
+
+    This is a single pass equivalent of `strip_dangling_commas(strip_comments(text))`. Only strings, comments, and
+    commas are matched, and the text between them is copied as slices of the source. A comma is held as pending until
+    the next code after it (skipping white space and comments) shows whether it dangles before a closing bracket.
+    """
+
+    out = []
+    append = out.append
+    # End of the text that has been handled
+    last = 0
+    # End of the last string or comment, single line comments take any white space that directly follows it
+    boundary = 0
+    # Position in `out` of a comma that may be dangling
+    pending = -1
+
+    for m in SANITIZE_PATTERN.finditer(text):
+        kind = m.lastgroup
+        start = m.start()
+        if kind == 'line' and boundary < start and WHITE_SPACE.match(text, boundary, start).end() == start:
+            start = boundary
+
+        if pending >= 0:
+            bracket = CLOSING_BRACKET.match(text, last, start)
+            if bracket is not None:
+                if preserve_lines:
+                    out[pending] = ''
+                else:
+                    del out[pending:]
+                    last = bracket.end() - 1
+                pending = -1
+            elif WHITE_SPACE.match(text, last, start).end() != start:
+                pending = -1
+        if last < start:
+            append(text[last:start])
+
+        last = m.end()
+        if kind == 'comma':
+            pending = len(out)
+            append(',')
+        elif kind == 'string':
+            pending = -1
+            append(text[start:last])
+            boundary = last
+        else:
+            if preserve_lines:
+                append(''.join([x[0] for x in LINE_PRESERVE.findall(text, start, last)]))
+            boundary = last
+
+    if pending >= 0:
+        bracket = CLOSING_BRACKET.match(text, last)
+        if bracket is not None:
+            if preserve_lines:
+                out[pending] = ''
+            else:
+                del out[pending:]
+                last = bracket.end() - 1
+    append(text[last:])
 
-    return strip_dangling_commas(Comments('json', preserve_lines).strip(text), preserve_lines)
+    return ''.join(out)
@@ -0,0 +1,339 @@
+"""
+Color scheme rules.
+
+Parses color scheme rules and their scope selectors, and indexes the rules by the
+scope atoms their selectors require so that the rules matching a scope can be
+found without testing every rule. Selector scores approximate Sublime's: a match
+on a deeper scope beats any number of matches on shallower ones, and among
+matches at the same depth, more matched dotted parts win.
+
+Licensed under MIT
+Copyright (c) 2012 - 2016 Isaac Muse <isaacmuse@gmail.com>
+"""
+import json
+import plistlib
+import re
+from .file_strip.json import sanitize_json
+
+RE_TOKEN = re.compile(r'[(),|&]|[^\s(),|&]+')
+RE_VARIABLE = re.compile(r'var\(\s*([^\s)]+)\s*\)')
+
+# Max matched parts per scope atom that scores can hold without overflowing into the next depth
+DEPTH_SHIFT = 5
+
+# Rule keys that aren't style settings
+RULE_KEYS = ('name', 'scope')
+
+
+class SelectorError(Exception):
+    """Scope selector parsing error."""
+
+
+class Everything(object):
+    """Match any scope (e.g. the left side of a leading `-`)."""
+
+    def match(self, stack):
+        """Match with the lowest score."""
+
+        return 0
+
+    def atoms(self):
+        """Not indexable."""
+
+        return None
+
+
+class Path(object):
+    """Descendant path of scope atoms (`source.python string`)."""
+
+    def __init__(self, atoms):
+        """Initialize."""
+
+        self.parts = [atom.split('.') for atom in atoms]
+
+    def match(self, stack):
+        """Match the atoms in order against the scope stack, preferring the deepest scopes."""
+
+        score = 0
+        depth = len(stack) - 1
+        for parts in reversed(self.parts):
+            count = len(parts)
+            while depth >= 0 and stack[depth][:count] != parts:
+                depth -= 1
+            if depth < 0:
+                return None
+            score += count << (depth * DEPTH_SHIFT)
+            depth -= 1
+        return score
+
+    def atoms(self):
+        """Every match needs the last atom."""
+
+        return ['.'.join(self.parts[-1])]
+
+
+class Any(object):
+    """Alternatives (`a, b` or `a | b`)."""
+
+    def __init__(self, selectors):
+        """Initialize."""
+
+        self.selectors = selectors
+
+    def match(self, stack):
+        """Get the best score of the alternatives."""
+
+        best = None
+        for selector in self.selectors:
+            score = selector.match(stack)
+            if score is not None and (best is None or score > best):
+                best = score
+        return best
+
+    def atoms(self):
+        """Any alternative may match."""
+
+        atoms = []
+        for selector in self.selectors:
+            a = selector.atoms()
+            if a is None:
+                return None
+            atoms.extend(a)
+        return atoms
+
+
+class All(object):
+    """Intersection (`a & b`)."""
+
+    def __init__(self, left, right):
+        """Initialize."""
+
+        self.left = left
+        self.right = right
+
+    def match(self, stack):
+        """Match both sides."""
+
+        left = self.left.match(stack)
+        if left is None:
+            return None
+        right = self.right.match(stack)
+        if right is None:
+            return None
+        return max(left, right)
+
+    def atoms(self):
+        """Both sides must match, so either side's atoms will do."""
+
+        atoms = self.left.atoms()
+        return self.right.atoms() if atoms is None else atoms
+
+
+class Exclude(object):
+    """Exclusion (`a - b`)."""
+
+    def __init__(self, left, right):
+        """Initialize."""
+
+        self.left = left
+        self.right = right
+
+    def match(self, stack):
+        """Match the left side if the right side doesn't match."""
+
+        score = self.left.match(stack)
+        if score is None or self.right.match(stack) is not None:
+            return None
+        return score
+
+    def atoms(self):
+        """The left side must match."""
+
+        return self.left.atoms()
+
+
+class SelectorParser(object):
+    """Parse a scope selector."""
+
+    def __init__(self, text):
+        """Initialize."""
+
+        self.tokens = []
+        for token in RE_TOKEN.findall(text):
+            # A leading `-` is an operator, dashes within atoms are not (`meta.function-call`)
+            if token.startswith('-'):
+                self.tokens.append('-')
+                token = token[1:]
+            if token:
+                self.tokens.append(token)
+        self.pos = 0
+
+    def peek(self):
+        """Get the current token."""
+
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        """Parse the selector."""
+
+        selector = self.parse_any(',')
+        if self.peek() is not None:
+            raise SelectorError('Unexpected {!r}'.format(self.peek()))
+        return selector
+
+    def parse_any(self, operator):
+        """Parse alternatives separated by `,`, or by `|` within them."""
+
+        selectors = [self.parse_any('|') if operator == ',' else self.parse_all()]
+        while self.peek() == operator:
+            self.pos += 1
+            selectors.append(self.parse_any('|') if operator == ',' else self.parse_all())
+        return selectors[0] if len(selectors) == 1 else Any(selectors)
+
+    def parse_all(self):
+        """Parse intersections and exclusions."""
+
+        left = Everything() if self.peek() == '-' else self.parse_term()
+        while self.peek() in ('&', '-'):
+            operator = self.tokens[self.pos]
+            self.pos += 1
+            right = self.parse_term()
+            left = All(left, right) if operator == '&' else Exclude(left, right)
+        return left
+
+    def parse_term(self):
+        """Parse a group or a path."""
+
+        if self.peek() == '(':
+            self.pos += 1
+            selector = self.parse_any(',')
+            if self.peek() != ')':
+                raise SelectorError('Expected ")"')
+            self.pos += 1
+            return selector
+
+        atoms = []
+        while self.peek() is not None and self.peek() not in ('(', ')', ',', '|', '&', '-'):
+            atoms.append(self.tokens[self.pos])
+            self.pos += 1
+        return Path(atoms) if atoms else Everything()
+
+
+def parse_selector(text):
+    """Parse a scope selector."""
+
+    return SelectorParser(text).parse()
+
+
+def scope_stack(scope):
+    """Split a scope into the dotted parts of each of its atoms."""
+
+    return [atom.split('.') for atom in scope.split()]
+
+
+class SchemeRule(object):
+    """A color scheme rule."""
+
+    __slots__ = ('source', 'index', 'name', 'scope', 'selector', 'settings')
+
+    def __init__(self, source, index, name, scope, settings):
+        """Initialize."""
+
+        self.source = source
+        self.index = index
+        self.name = name
+        self.scope = scope
+        self.settings = settings
+        try:
+            self.selector = parse_selector(scope)
+        except SelectorError:
+            self.selector = None
+
+
+def resolve_variables(value, variables, depth=10):
+    """Resolve `var()` references in a setting value."""
+
+    if not isinstance(value, str):
+        return value
+    while depth and 'var(' in value:
+        resolved = RE_VARIABLE.sub(lambda m: str(variables.get(m.group(1), m.group(0))), value)
+        if resolved == value:
+            break
+        value = resolved
+        depth -= 1
+    return value
+
+
+def read_scheme(source, text):
+    """Read the `(variables, rules)` of a `.sublime-color-scheme` or `.tmTheme` file."""
+
+    if source.endswith(('.tmTheme', '.hidden-tmTheme')):
+        obj = plistlib.loads(text.encode('utf-8'))
+        rules = []
+        for item in obj.get('settings', []):
+            if 'scope' in item:
+                rule = dict(item.get('settings', {}))
+                rule['name'] = item.get('name')
+                rule['scope'] = item['scope']
+                rules.append(rule)
+        return {}, rules
+
+    obj = json.loads(sanitize_json(text))
+    return obj.get('variables', {}), obj.get('rules', [])
+
+
+class RuleIndex(object):
+    """Index of color scheme rules by the first part of the scope atoms their selectors require."""
+
+    def __init__(self, schemes):
+        """Build the index from the `(source, text)` of the color scheme and its overrides, in order."""
+
+        variables = {}
+        read = []
+        for source, text in schemes:
+            v, rules = read_scheme(source, text)
+            variables.update(v)
+            read.append((source, rules))
+
+        self.rules = []
+        self.index = {}
+        # Rules that can't be indexed and are always tested
+        self.unindexed = []
+        for source, rules in read:
+            for i, rule in enumerate(rules):
+                settings = dict(
+                    (k, resolve_variables(v, variables)) for k, v in rule.items() if k not in RULE_KEYS
+                )
+                rule = SchemeRule(source, i, rule.get('name'), rule.get('scope', ''), settings)
+                if rule.selector is None:
+                    continue
+                self.add(rule)
+
+    def add(self, rule):
+        """Add a rule to the index."""
+
+        order = len(self.rules)
+        self.rules.append(rule)
+        atoms = rule.selector.atoms()
+        if atoms is None:
+            self.unindexed.append(order)
+            return
+        for key in set(atom.split('.')[0] for atom in atoms):
+            self.index.setdefault(key, []).append(order)
+
+    def candidates(self, scope):
+        """Get the `(score, rule)` of the rules matching the scope, best first (later rules win ties)."""
+
+        stack = scope_stack(scope)
+        orders = set(self.unindexed)
+        for parts in stack:
+            orders.update(self.index.get(parts[0], ()))
+
+        matches = []
+        for order in orders:
+            rule = self.rules[order]
+            score = rule.selector.match(stack)
+            if score is not None:
+                matches.append((score, order, rule))
+        matches.sort(key=lambda m: (m[0], m[1]), reverse=True)
+        return [(score, rule) for score, order, rule in matches]
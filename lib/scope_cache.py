@@ -0,0 +1,146 @@
+"""
+Scope map cache.
+
+Scope maps are stored on disk as JSON Lines: a header line with the cache key and a
+table of the distinct scopes, then one `[begin, end, scope index]` line per extent.
+Files are keyed by a hash of the syntax, the syntax content, and the buffer content,
+and the least recently used files are evicted when the cache exceeds its size limit.
+
+Licensed under MIT
+Copyright (c) 2012 - 2016 Isaac Muse <isaacmuse@gmail.com>
+"""
+import hashlib
+import json
+import os
+import threading
+
+VERSION = 1
+EXTENSION = '.jsonl'
+
+
+def content_hash(text):
+    """Hash text content."""
+
+    return hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def make_key(syntax, syntax_hash, text_hash, *extra):
+    """Make a cache key from the syntax file, the syntax hash, and the content hash."""
+
+    return hashlib.sha1(
+        '\0'.join([str(syntax), syntax_hash, text_hash] + [str(x) for x in extra]).encode('utf-8')
+    ).hexdigest()
+
+
+class ScopeMapCache(object):
+    """Size bounded on-disk LRU cache of scope maps."""
+
+    def __init__(self, folder, max_size):
+        """Initialize."""
+
+        self.folder = folder
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        """Get the path of the cache file for the key."""
+
+        return os.path.join(self.folder, key + EXTENSION)
+
+    def get(self, key):
+        """Get the scope map of the key, or `None` if it isn't cached."""
+
+        if self.max_size <= 0:
+            return None
+
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header.get('version') != VERSION or header.get('key') != key:
+                    return None
+                scopes = header['scopes']
+                extents = []
+                for line in f:
+                    begin, end, index = json.loads(line)
+                    extents.append((begin, end, scopes[index]))
+            if len(extents) != header['count']:
+                return None
+            # Mark as recently used
+            os.utime(path, None)
+        except Exception:
+            return None
+        return extents
+
+    def set(self, key, extents):
+        """Store the scope map of the key and evict old entries if the cache is too big."""
+
+        if self.max_size <= 0:
+            return
+
+        scopes = {}
+        lines = []
+        for begin, end, scope in extents:
+            index = scopes.get(scope)
+            if index is None:
+                index = scopes[scope] = len(scopes)
+            lines.append('[{:d},{:d},{:d}]\n'.format(begin, end, index))
+        header = {'version': VERSION, 'key': key, 'count': len(lines), 'scopes': list(scopes)}
+
+        with self.lock:
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                path = self.path(key)
+                tmp = '{}.{:d}.tmp'.format(path, threading.get_ident())
+                with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+                    f.write(json.dumps(header) + '\n')
+                    f.write(''.join(lines))
+                os.replace(tmp, path)
+            except Exception:
+                return
+            self.evict()
+
+    def entries(self):
+        """Get `(mtime, size, path)` of each cache file, oldest first."""
+
+        entries = []
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(EXTENSION):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits its size limit."""
+
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        # Never evict the newest entry, even if it is bigger than the limit on its own
+        for mtime, size, path in entries[:-1]:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """Remove all cache files."""
+
+        with self.lock:
+            for entry in self.entries():
+                try:
+                    os.remove(entry[2])
+                except OSError:
+                    pass
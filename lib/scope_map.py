@@ -0,0 +1,113 @@
+"""
+Scope map.
+
+A scope map is a run length encoded list of `(begin, end, scope)` extents that
+covers a buffer, where adjacent extents never share the same scope.
+
+Licensed under MIT
+Copyright (c) 2012 - 2016 Isaac Muse <isaacmuse@gmail.com>
+"""
+import json
+
+TSV_HEADER = 'begin\tend\tscope\n'
+
+
+class Coalescer(object):
+    """
+    Merge adjacent `(begin, end, scope)` tokens with identical scopes into extents.
+
+    Tokens can be fed in chunks, the last extent is held back until a token with a
+    different scope arrives or the coalescer is flushed.
+    """
+
+    def __init__(self):
+        """Initialize."""
+
+        self.current = None
+
+    def feed(self, tokens):
+        """Feed tokens and return the extents that are complete."""
+
+        extents = []
+        current = self.current
+        for begin, end, scope in tokens:
+            if current is not None:
+                if current[2] == scope and current[1] == begin:
+                    current[1] = end
+                    continue
+                extents.append(tuple(current))
+            current = [begin, end, scope]
+        self.current = current
+        return extents
+
+    def flush(self):
+        """Return the last extent, if there is one."""
+
+        extents = [] if self.current is None else [tuple(self.current)]
+        self.current = None
+        return extents
+
+
+def coalesce(tokens):
+    """Merge adjacent `(begin, end, scope)` tokens with identical scopes into extents."""
+
+    coalescer = Coalescer()
+    return coalescer.feed(tokens) + coalescer.flush()
+
+
+def format_tsv(extent):
+    """Format an extent as a tab separated line."""
+
+    return '{}\t{}\t{}\n'.format(extent[0], extent[1], extent[2].strip())
+
+
+def format_jsonl(extent):
+    """Format an extent as a JSON line."""
+
+    return json.dumps({'begin': extent[0], 'end': extent[1], 'scope': extent[2].strip()}) + '\n'
+
+
+# Format name: (header, line formatter)
+FORMATS = {
+    'tsv': (TSV_HEADER, format_tsv),
+    'jsonl': ('', format_jsonl)
+}
+
+
+def diff(old, new):
+    """
+    Compare two scope maps of the same buffer.
+
+    Both maps are walked together in a single linear merge, and the ranges where the
+    scopes differ are returned as `(begin, end, old_scope, new_scope)`, with adjacent
+    ranges that share the same change merged.
+    """
+
+    changes = []
+    i = j = 0
+    count_old = len(old)
+    count_new = len(new)
+    while i < count_old and j < count_new:
+        begin_old, end_old, scope_old = old[i]
+        begin_new, end_new, scope_new = new[j]
+        begin = max(begin_old, begin_new)
+        end = min(end_old, end_new)
+        if begin < end and scope_old != scope_new:
+            last = changes[-1] if changes else None
+            if last is not None and last[1] == begin and last[2] == scope_old and last[3] == scope_new:
+                changes[-1] = (last[0], end, scope_old, scope_new)
+            else:
+                changes.append((begin, end, scope_old, scope_new))
+        if end_old <= end_new:
+            i += 1
+        if end_new <= end_old:
+            j += 1
+    return changes
+
+
+def format_diff(change, row, col):
+    """Format a scope change that starts at the given (zero based) row and column."""
+
+    return '{:d}:{:d} [{:d}, {:d}]\n  - {}\n  + {}\n'.format(
+        row + 1, col + 1, change[0], change[1], change[2].strip(), change[3].strip()
+    )
@@ -0,0 +1,100 @@
+"""
+Scope statistics.
+
+Tallies characters and extents per scope from a stream of `(begin, end, scope)`
+extents, with memory proportional to the number of distinct scopes.
+
+Licensed under MIT
+Copyright (c) 2012 - 2016 Isaac Muse <isaacmuse@gmail.com>
+"""
+ROW = '{:>12,d} {:>6.2f}% {:>10,d}  {}'
+HEADER = '{:>12} {:>7} {:>10}  {}'.format('chars', '%', 'extents', '{}')
+
+
+def scope_prefixes(scope):
+    """Get the dotted prefixes of the innermost scope (`string`, `string.quoted`, ...)."""
+
+    parts = scope.split()[-1].split('.') if scope.strip() else []
+    return ['.'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+class ScopeStats(object):
+    """Character and extent counts per scope."""
+
+    def __init__(self):
+        """Initialize."""
+
+        self.scopes = {}
+        self.files = 0
+
+    def feed(self, extents):
+        """Count a batch of extents."""
+
+        scopes = self.scopes
+        for begin, end, scope in extents:
+            tally = scopes.get(scope)
+            if tally is None:
+                tally = scopes[scope] = [0, 0]
+            tally[0] += end - begin
+            tally[1] += 1
+
+    def totals(self):
+        """Get the total characters and extents."""
+
+        chars = extents = 0
+        for c, e in self.scopes.values():
+            chars += c
+            extents += e
+        return chars, extents
+
+    def by_scope(self):
+        """Get `(scope, chars, extents)` of each scope, most characters first."""
+
+        return sorted(
+            ((scope.strip(), c, e) for scope, (c, e) in self.scopes.items()),
+            key=lambda x: (-x[1], x[0])
+        )
+
+    def by_prefix(self):
+        """Get `(prefix, chars, extents)` of each prefix of the innermost scopes, most characters first."""
+
+        prefixes = {}
+        for scope, (c, e) in self.scopes.items():
+            for prefix in scope_prefixes(scope):
+                tally = prefixes.get(prefix)
+                if tally is None:
+                    tally = prefixes[prefix] = [0, 0]
+                tally[0] += c
+                tally[1] += e
+        return sorted(((p, c, e) for p, (c, e) in prefixes.items()), key=lambda x: (-x[1], x[0]))
+
+    def report(self, name, unstyled=(), top=25):
+        """Format a report of the hot scopes and the given unstyled scopes."""
+
+        chars, extents = self.totals()
+        total = max(1, chars)
+        lines = [
+            'Scope stats: {}'.format(name),
+            'Files: {:,d}, characters: {:,d}, extents: {:,d}, distinct scopes: {:,d}'.format(
+                self.files, chars, extents, len(self.scopes)
+            ),
+            ''
+        ]
+
+        sections = (
+            ('Top {:d} scopes'.format(top), 'scope', self.by_scope()[:top]),
+            ('Top {:d} scope prefixes'.format(top), 'prefix', self.by_prefix()[:top]),
+            (
+                'Scopes using the default foreground ({:,d})'.format(len(unstyled)),
+                'scope',
+                [x for x in self.by_scope() if x[0] in unstyled]
+            )
+        )
+        for title, label, rows in sections:
+            lines.append(title)
+            lines.append(HEADER.format(label))
+            for scope, c, e in rows:
+                lines.append(ROW.format(c, c * 100 / total, e, scope))
+            lines.append('')
+
+        return '\n'.join(lines)
@@ -6,14 +6,19 @@ Copyright (c) 2012 - 2016 Isaac Muse <isaacmuse@gmail.com>
 """
 import sublime
 import sublime_plugin
-from time import time, sleep
+from time import time, perf_counter
 import threading
 from ScopeHunter.scope_hunter_notify import notify
+from ScopeHunter.lib.scheme_rules import RuleIndex
 from textwrap import dedent
 import mdpopups
-from collections import namedtuple
+import jinja2
+from collections import namedtuple, OrderedDict, deque
 from mdpopups.coloraide import Color
+import bisect
+import json
 import os
+import weakref
 
 AUTO = int(sublime.version()) >= 4095
 
@@ -60,16 +65,41 @@ ADD_CSS = dedent(
     '''
 )
 
+POPUP_TEMPLATE = 'Packages/ScopeHunter/popup.j2'
+SCHEME_EXTENSIONS = ('.sublime-color-scheme', '.hidden-color-scheme', '.tmTheme', '.hidden-tmTheme')
+
 COPY_ALL = '''
 ---
 
-[Copy All](copy-all){: .small .button}
+[Copy All](copy-all){: .small .button} [Copy All (JSON)](copy-all-json){: .small .button}
+'''
+
+MORE_ENTRIES = '''
+---
+
++{} more scopes
+{{: .small}}
 '''
 
+# Max cursor positions to list for a scope
+MAX_POSITIONS = 10
+
+# Max color scheme rules to list for a scope
+MAX_RULES = 10
+
+# Profiling report
+PROFILE_HEADER = "{:20} {:>8} {:>10} {:>10} {:>10}"
+PROFILE_ROW = "{:20} {:>8d} {:>10.3f} {:>10.3f} {:>10.3f}"
+
 # Text Entry
 ENTRY = "{:30} {}"
+CONTINUATION = "\n" + (" " * 31)
 SCOPE_KEY = "Scope"
+CURSORS_KEY = "Cursors"
+CURSOR_VALUE = "{:d}:{:d}"
 CONTEXT_BACKTRACE_KEY = "Scope Context Backtrace"
+RULES_KEY = "Scheme Rules"
+RULE_VALUE = "{} ({} #{:d})"
 PTS_KEY = "Scope Extents (Pts)"
 PTS_VALUE = "({:d}, {:d})"
 CHAR_LINE_KEY = "Scope Extents (Line:Char)"
@@ -105,6 +135,109 @@ class SchemeColors(
     """Scheme colors."""
 
 
+class ScopeSnapshot:
+    """
+    Scope data for a point.
+
+    Data is gathered from the view once and shared by all the formatters.
+    """
+
+    __slots__ = ('pt', 'scope', 'backtrace', 'extent', 'rowcol', 'style', 'rules')
+
+    def __init__(self, pt, scope):
+        """Initialize."""
+
+        self.pt = pt
+        self.scope = scope
+        self.backtrace = None
+        self.extent = None
+        self.rowcol = None
+        self.style = None
+        self.rules = None
+
+
+class ScopeRecord:
+    """
+    Scope info of a popup entry, as shown in the popup.
+
+    Fields are `None` when the info is not shown (or collapsed).
+    """
+
+    __slots__ = (
+        'scope', 'cursors', 'context_backtrace', 'points', 'line_char',
+        'fg', 'bg', 'style', 'rules', 'syntax', 'scheme', 'overrides'
+    )
+
+    def __init__(self):
+        """Initialize."""
+
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def to_text(self):
+        """Format the record as plain text."""
+
+        lines = []
+        for name, label, fmt in RECORD_TEXT:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if name == 'overrides':
+                for idx, override in enumerate(value, 1):
+                    lines.append(ENTRY.format(OVERRIDE_SCHEME_KEY + (" {}:".format(idx)), override))
+            else:
+                lines.append(ENTRY.format(label + ':', fmt(value)))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """Get the fields that are shown."""
+
+        return OrderedDict((name, getattr(self, name)) for name in self.__slots__ if getattr(self, name) is not None)
+
+
+def format_points(points):
+    """Format the extent points."""
+
+    return PTS_VALUE.format(*points)
+
+
+def format_line_char(line_char):
+    """Format the extent lines and chars."""
+
+    return CHAR_LINE_VALUE.format(*line_char)
+
+
+# Record field, label, and plain text formatter, in display order
+RECORD_TEXT = (
+    ('scope', SCOPE_KEY, lambda value: value.replace(' ', CONTINUATION)),
+    ('cursors', CURSORS_KEY, str),
+    ('context_backtrace', CONTEXT_BACKTRACE_KEY, CONTINUATION.join),
+    ('points', PTS_KEY, format_points),
+    ('line_char', CHAR_LINE_KEY, format_line_char),
+    ('fg', FG_KEY, str),
+    ('bg', BG_KEY, str),
+    ('style', STYLE_KEY, str),
+    ('rules', RULES_KEY, CONTINUATION.join),
+    ('syntax', SYNTAX_KEY, str),
+    ('scheme', SCHEME_KEY, str),
+    ('overrides', OVERRIDE_SCHEME_KEY, None)
+)
+
+# Copy link key: (label, record field, clipboard formatter)
+COPY_ACTIONS = {
+    'copy-scope': (SCOPE_KEY, 'scope', str),
+    'copy-context-backtrace': (CONTEXT_BACKTRACE_KEY, 'context_backtrace', '\n'.join),
+    'copy-points': (PTS_KEY, 'points', format_points),
+    'copy-line-char': (CHAR_LINE_KEY, 'line_char', format_line_char),
+    'copy-fg': (FG_KEY, 'fg', str),
+    'copy-bg': (BG_KEY, 'bg', str),
+    'copy-style': (STYLE_KEY, 'style', str),
+    'copy-rules': (RULES_KEY, 'rules', '\n'.join),
+    'copy-scheme': (SCHEME_KEY, 'scheme', str),
+    'copy-syntax': (SYNTAX_KEY, 'syntax', str)
+}
+
+
 def log(msg):
     """Logging."""
     print("ScopeHunter: {}".format(msg))
@@ -134,9 +267,10 @@ def extent_style(option):
         style |= sublime.DRAW_NO_FILL
     elif option == "none":
         style |= sublime.HIDDEN
-    elif option == "underline":
+    elif option == "thick_underline":
+        # Requires the extents to be split into empty regions, see `underline`
         style |= sublime.DRAW_EMPTY_AS_OVERWRITE
-    elif option == "thin_underline":
+    elif option in ("underline", "thin_underline"):
         style |= sublime.DRAW_NO_FILL
         style |= sublime.DRAW_NO_OUTLINE
         style |= sublime.DRAW_SOLID_UNDERLINE
@@ -152,7 +286,7 @@ def extent_style(option):
 
 
 def underline(regions):
-    """Convert to empty regions."""
+    """Convert to empty regions (one per character) for the `thick_underline` style."""
 
     new_regions = []
     for region in regions:
@@ -164,16 +298,443 @@ def underline(regions):
     return new_regions
 
 
-def copy_data(bfr, label, index, copy_format=None):
-    """Copy data to clipboard from buffer."""
+def find_extent(regions, pt, file_end):
+    """Find the extent containing the point by scanning the regions."""
+
+    for r in regions:
+        if r.contains(pt):
+            return r
+        elif pt == file_end and r.end() == pt:
+            return r
+    return None
+
+
+class ScopeExtentIndex:
+    """
+    Sorted index of scope extents per view.
+
+    Extents are stored per view and scope name, and are only valid for the `change_count`
+    they were collected at. As an edit can change the scopes anywhere after it, every edit
+    drops the view's extents. The first lookup of a scope after an edit scans the regions
+    directly, and the regions are only indexed for a binary search once the scope is looked
+    up again at the same `change_count`, so that typing doesn't pay for indexes it throws away.
+    """
+
+    def __init__(self, max_scopes=64):
+        """Initialize."""
+
+        self.max_scopes = max_scopes
+        self.views = {}
+
+    def clear(self):
+        """Clear all indexes."""
+
+        self.views.clear()
+
+    def invalidate(self, view_id):
+        """Invalidate the indexes of the given view."""
+
+        self.views.pop(view_id, None)
+
+    def get_scopes(self, view):
+        """Get the scope indexes for the view's current change count."""
+
+        view_id = view.id()
+        change_count = view.change_count()
+        entry = self.views.get(view_id)
+        if entry is None or entry[0] != change_count:
+            entry = (change_count, OrderedDict())
+            self.views[view_id] = entry
+        return entry[1]
+
+    def lookup(self, view, scope_name, pt):
+        """Get the extent of the scope that contains the point."""
+
+        scopes = self.get_scopes(view)
+        index = scopes.get(scope_name)
+
+        if index is None:
+            # Scope is cold, so search the regions directly and only keep them for later
+            regions = view.find_by_selector(scope_name)
+            scopes[scope_name] = (None, regions)
+            if len(scopes) > self.max_scopes:
+                scopes.popitem(last=False)
+            return find_extent(regions, pt, view.size())
+
+        scopes.move_to_end(scope_name)
+        begins, regions = index
+        if begins is None:
+            # Scope is looked up again before the next edit, so index it
+            begins = [r.begin() for r in regions]
+            scopes[scope_name] = (begins, regions)
+        i = bisect.bisect_right(begins, pt) - 1
+        # Adjacent extents share an edge, and the first one that contains the point wins
+        if i > 0 and regions[i - 1].end() >= pt:
+            i -= 1
+        if i >= 0 and regions[i].contains(pt):
+            return regions[i]
+        return None
+
+
+extent_index = ScopeExtentIndex()
+
+
+class TemplateCache:
+    """
+    Cache of the popup template text and its compiled form.
+
+    The compiled template is reused until the resource is saved or the settings generation changes.
+    """
+
+    def __init__(self, resource):
+        """Initialize."""
+
+        self.resource = resource
+        self.generation = 0
+        self.key = None
+        self.template = None
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        """Invalidate the compiled template."""
+
+        self.generation += 1
+
+    def get(self):
+        """Get the compiled template."""
+
+        key = (self.resource, self.generation)
+        if self.template is None or key != self.key:
+            self.misses += 1
+            env = jinja2.Environment(trim_blocks=True, lstrip_blocks=True)
+            self.template = env.from_string(sublime.load_resource(self.resource))
+            self.key = key
+        else:
+            self.hits += 1
+        return self.template
+
+    def render(self, template_vars):
+        """Render the template to Markdown."""
+
+        return self.get().render(plugin=template_vars)
+
+
+popup_template = TemplateCache(POPUP_TEMPLATE)
+
+
+class LRUCache:
+    """Bounded least recently used cache."""
+
+    def __init__(self, max_size):
+        """Initialize."""
+
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Clear the cache."""
+
+        with self.lock:
+            self.cache.clear()
+
+    def get(self, key):
+        """Get a cached value, or `None` if it is not cached."""
+
+        with self.lock:
+            value = self.cache.get(key)
+            if value is not None:
+                self.cache.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """Cache a value, evicting the least recently used entry if full."""
+
+        with self.lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+
+style_cache = LRUCache(256)
+rule_index_cache = {}
+settings_generation = 0
+scheme_cache = {}
+auto_scheme = None
+border_cache = LRUCache(16)
+size_cache = {}
+
+
+def get_font_settings(settings):
+    """Get the view settings that affect popup sizes."""
+
+    return (
+        settings.get('font_face'),
+        settings.get('font_size'),
+        settings.get('line_padding_top', 0),
+        settings.get('line_padding_bottom', 0)
+    )
+
+
+def get_color_scheme(view):
+    """Get the color scheme used by the view."""
+
+    global auto_scheme
+
+    # Attempt syntax specific from view
+    scheme_file = view.settings().get('color_scheme', None)
+
+    # Get global scheme
+    if scheme_file is None:
+        pref_settings = sublime.load_settings('Preferences.sublime-settings')
+        scheme_file = pref_settings.get('color_scheme')
+
+    if scheme_file == 'auto' and AUTO:
+        # Resolving `auto` is costly, so it is cached until the window focus or preferences change
+        if auto_scheme is None:
+            info = sublime.ui_info()
+            auto_scheme = info['color_scheme']['resolved_value']
+        scheme_file = auto_scheme
+
+    return scheme_file.replace('\\', '/')
+
+
+def find_scheme_overrides(scheme_file):
+    """Find the color scheme's resource path and the overrides that apply to it."""
+
+    if not scheme_file.startswith('Packages/'):
+        # Color schemes can be set by file name only, the first match is the color scheme and the rest override it
+        resources = sublime.find_resources(os.path.basename(scheme_file))
+        if resources:
+            scheme_file = resources[0]
+
+    package_overrides = []
+    user_overrides = []
+    if scheme_file.endswith('.hidden-color-scheme'):
+        pattern = '%s.hidden-color-scheme'
+    else:
+        pattern = '%s.sublime-color-scheme'
+
+    for override in sublime.find_resources(pattern % os.path.basename(os.path.splitext(scheme_file)[0])):
+        if override == scheme_file:
+            continue
+        if override.startswith('Packages/User/'):
+            user_overrides.append(override)
+        else:
+            package_overrides.append(override)
+    return scheme_file, package_overrides + user_overrides
+
+
+def clear_scheme_cache():
+    """Clear cached color scheme resolution and anything derived from it."""
+
+    global auto_scheme
+    auto_scheme = None
+    scheme_cache.clear()
+    style_cache.clear()
+    border_cache.clear()
+    rule_index_cache.clear()
+
+
+def resource_mtime(resource):
+    """Get the modified time of a resource's file, or of the package it is in, if it can be found."""
+
+    package = resource.split('/')[1]
+    for path in (
+        os.path.join(sublime.packages_path(), resource[9:]),
+        os.path.join(sublime.installed_packages_path(), package + '.sublime-package'),
+        os.path.join(os.path.dirname(sublime.executable_path()), 'Packages', package + '.sublime-package')
+    ):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            pass
+    return None
+
+
+def get_rule_index(scheme_file, overrides):
+    """
+    Get the rule index of the color scheme and its overrides, rebuilt when one of the files changes.
+
+    The color scheme is the resource path resolved by `find_scheme_overrides`.
+    """
+
+    if not scheme_file.startswith('Packages/'):
+        # The color scheme couldn't be found
+        return None
+
+    files = [scheme_file] + list(overrides)
+    key = tuple((f, resource_mtime(f)) for f in files)
+    cached = rule_index_cache.get(scheme_file)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    try:
+        index = RuleIndex([(f, sublime.load_resource(f)) for f in files])
+    except Exception as e:
+        debug('Failed to index color scheme rules of {}: {}'.format(scheme_file, e))
+        index = None
+    rule_index_cache[scheme_file] = (key, index)
+    return index
+
+
+def guess_style(view, scope, selected=False, no_bold=False, no_italic=False, explicit_background=False):
+    """Guess the style of the scope (cached per color scheme)."""
+
+    key = (get_color_scheme(view), scope, selected, no_bold, no_italic, explicit_background)
+    colors = style_cache.get(key)
+    if colors is None:
+        colors = resolve_style(view, scope, selected, no_bold, no_italic, explicit_background)
+        style_cache.set(key, colors)
+    return colors
+
+
+def resolve_style(view, scope, selected, no_bold, no_italic, explicit_background):
+    """Resolve the style of the scope from the view."""
+
+    # Remove leading '.' to account for old style CSS
+    scope_style = view.style_for_scope(scope.lstrip('.'))
+    style = {}
+    style['foreground'] = scope_style['foreground']
+    style['background'] = scope_style.get('background')
+    style['bold'] = scope_style.get('bold', False) and not no_bold
+    style['italic'] = scope_style.get('italic', False) and not no_italic
+    style['underline'] = scope_style.get('underline', False)
+    style['glow'] = scope_style.get('glow', False)
+
+    font_styles = []
+    for k, v in style.items():
+        if k in ('bold', 'italic', 'underline', 'glow'):
+            if v is True:
+                font_styles.append(k)
+    font_styles = ' '.join(font_styles)
+
+    defaults = view.style()
+    if not explicit_background and not style.get('background'):
+        style['background'] = defaults.get('background', '#FFFFFF')
+    if selected:
+        sfg = scope_style.get('selection_foreground', defaults.get('selection_foreground'))
+        if sfg != '#00000000':
+            style['foreground'] = sfg
+        style['background'] = defaults.get('selection', '#0000FF')
+
+    source = scope_style.get('source_file', '')
+    line = ''
+    col = ''
+    if source:
+        line = scope_style.get('source_line', '')
+        col = scope_style.get('source_column', '')
+
+    return SchemeColors(style['foreground'], style['background'], font_styles, source, line, col)
+
+
+class StageTimer:
+    """Time a stage and record it with the profiler."""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        """Initialize."""
+
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        """Start timing."""
+
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        """Stop timing and record the sample."""
+
+        self.profiler.record(self.name, perf_counter() - self.start)
+
+
+class NullTimer:
+    """Timer used when profiling is disabled."""
+
+    def __enter__(self):
+        """Do nothing."""
+
+        return self
+
+    def __exit__(self, *args):
+        """Do nothing."""
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageProfiler:
+    """Rolling timings of each stage of a refresh."""
+
+    def __init__(self, samples=500):
+        """Initialize."""
+
+        self.samples = samples
+        self.enabled = False
+        self.stages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Clear all samples."""
+
+        with self.lock:
+            self.stages.clear()
+
+    def stage(self, name):
+        """Get a timer for the stage."""
+
+        return StageTimer(self, name) if self.enabled else NULL_TIMER
+
+    def record(self, name, elapsed):
+        """Record a sample for the stage."""
+
+        with self.lock:
+            samples = self.stages.get(name)
+            if samples is None:
+                samples = self.stages[name] = deque(maxlen=self.samples)
+            samples.append(elapsed)
+
+    def stats(self):
+        """Get the sample count and p50, p95, and max timings (in milliseconds) of each stage."""
+
+        with self.lock:
+            stages = [(name, sorted(samples)) for name, samples in self.stages.items()]
+
+        results = []
+        for name, samples in stages:
+            count = len(samples)
+            results.append(
+                (
+                    name,
+                    count,
+                    samples[(count - 1) // 2] * 1000,
+                    samples[min(count - 1, int(count * 0.95))] * 1000,
+                    samples[-1] * 1000
+                )
+            )
+        return results
+
+    def report(self):
+        """Format the statistics as a table."""
+
+        lines = [PROFILE_HEADER.format('Stage', 'Count', 'p50 (ms)', 'p95 (ms)', 'max (ms)')]
+        for stats in self.stats():
+            lines.append(PROFILE_ROW.format(*stats))
+        return '\n'.join(lines)
 
-    line = bfr[index]
-    if line.startswith(label + ':'):
-        text = line.replace(label + ':', '', 1).strip()
-        if copy_format is not None:
-            text = copy_format(text)
-        sublime.set_clipboard(text)
-        notify("Copied: {}".format(label))
+
+profiler = StageProfiler()
+
+
+def get_render_token(view):
+    """Get a token identifying the view state that a render is based on."""
+
+    return (view.id(), view.change_count(), tuple((sel.a, sel.b) for sel in view.sel()))
 
 
 class ScopeHunterEditCommand(sublime_plugin.TextCommand):
@@ -196,8 +757,56 @@ class ScopeHunterEditCommand(sublime_plugin.TextCommand):
         cls.pt = None
 
 
+class ScopeHunterSession:
+    """
+    Scope hunting state of a view.
+
+    Sessions are only weakly held, and live as long as one of their renders does.
+    """
+
+    def __init__(self, view_id):
+        """Initialize."""
+
+        self.view_id = view_id
+        self.generation = 0
+        self.displayed = None
+        self.lock = threading.Lock()
+
+    def next_generation(self):
+        """Start a new render generation."""
+
+        with self.lock:
+            self.generation += 1
+            return self.generation
+
+
+sessions = weakref.WeakValueDictionary()
+
+
+def get_session(view):
+    """Get the session of the view."""
+
+    view_id = view.id()
+    session = sessions.get(view_id)
+    if session is None:
+        session = ScopeHunterSession(view_id)
+        sessions[view_id] = session
+    return session
+
+
 class GetSelectionScope:
-    """Get the scope and the selection(s)."""
+    """
+    Get the scope and the selection(s).
+
+    Each render gets its own instance, so popup links always resolve against the data they were rendered from.
+    """
+
+    def __init__(self, session):
+        """Initialize."""
+
+        self.session = session
+        self.generation = session.next_generation()
+        self.displayed = None
 
     def setup(self, sh_settings):
         """Setup."""
@@ -209,6 +818,16 @@ class GetSelectionScope:
     def setup_image_border(self, sh_settings):
         """Setup_image_border."""
 
+        key = (get_color_scheme(self.view), sh_settings.get('image_border_color'))
+        colors = border_cache.get(key)
+        if colors is None:
+            colors = self.calculate_image_border(sh_settings)
+            border_cache.set(key, colors)
+        self.default_border, self.out_of_gamut, self.out_of_gamut_border = colors
+
+    def calculate_image_border(self, sh_settings):
+        """Calculate the image border and out of gamut colors."""
+
         border_color = sh_settings.get('image_border_color')
         border_color = None
         if border_color is not None:
@@ -218,36 +837,60 @@ class GetSelectionScope:
             except Exception:
                 border_color = None
 
+        style = self.view.style()
         if border_color is None:
             # Calculate border color for images
             border_color = Color(
-                self.view.style()['background'],
+                style['background'],
                 filters=SRGB_SPACES
             ).convert("hsl")
             border_color['l'] = border_color['l'] + (30 if border_color.luminance() < 0.5 else -30)
 
-        self.default_border = border_color.convert("srgb").to_string(**HEX)
-        self.out_of_gamut = Color("transparent", filters=SRGB_SPACES).to_string(**HEX)
-        self.out_of_gamut_border = Color(
-            self.view.style().get('redish', "red"),
-            filters=SRGB_SPACES
-        ).to_string(**HEX)
+        return (
+            border_color.convert("srgb").to_string(**HEX),
+            Color("transparent", filters=SRGB_SPACES).to_string(**HEX),
+            Color(
+                style.get('redish', "red"),
+                filters=SRGB_SPACES
+            ).to_string(**HEX)
+        )
 
     def setup_sizes(self):
         """Get sizes."""
 
+        view_id = self.view.id()
+        sizes = size_cache.get(view_id)
+        if sizes is None:
+            settings = self.view.settings()
+            font_settings = get_font_settings(settings)
+            sizes = self.calculate_sizes(font_settings)
+            size_cache[view_id] = sizes
+
+            def on_change():
+                """Drop cached sizes if font or padding settings changed."""
+
+                if get_font_settings(settings) != font_settings:
+                    size_cache.pop(view_id, None)
+
+            settings.clear_on_change('scope_hunter.sizes')
+            settings.add_on_change('scope_hunter.sizes', on_change)
+
+        self.line_height, self.height, self.width = sizes
+
+    def calculate_sizes(self, font_settings):
+        """Calculate the line height and color box sizes."""
+
         # Calculate color box height
-        self.line_height = self.view.line_height()
-        top_pad = self.view.settings().get('line_padding_top', 0)
-        bottom_pad = self.view.settings().get('line_padding_bottom', 0)
+        line_height = self.view.line_height()
+        top_pad, bottom_pad = font_settings[2:]
         if top_pad is None:
             # Sometimes we strangely get None
             top_pad = 0
         if bottom_pad is None:
             bottom_pad = 0
-        box_height = self.line_height - int(top_pad + bottom_pad) - 6
+        box_height = line_height - int(top_pad + bottom_pad) - 6
 
-        self.height = self.width = box_height * 2
+        return line_height, box_height * 2, box_height * 2
 
     def check_size(self, height, scale=4):
         """Get checkered size."""
@@ -262,13 +905,7 @@ class GetSelectionScope:
 
         self.template_vars = {}
 
-    def next_index(self):
-        """Get next index into scope buffer."""
-
-        self.index += 1
-        return self.index
-
-    def get_color_box(self, color, key, index):
+    def get_color_box(self, color, key):
         """Display an HTML color box using the given color."""
 
         border = self.default_border
@@ -289,82 +926,106 @@ class GetSelectionScope:
             )
         )
         self.template_vars['{}_color'.format(key)] = ', '.join(colors)
-        self.template_vars['{}_index'.format(key)] = index
 
-    def get_extents(self, pt):
-        """Get the scope extent via the sublime API."""
+    def get_snapshot(self, pt, scope=None):
+        """Gather the scope data for the point (collapsed sections are gathered when they are expanded)."""
 
-        pts = None
-        file_end = self.view.size()
-        scope_name = self.view.scope_name(pt)
-        for r in self.view.find_by_selector(scope_name):
-            if r.contains(pt):
-                pts = r
-                break
-            elif pt == file_end and r.end() == pt:
-                pts = r
-                break
+        if scope is None:
+            with profiler.stage('scope_name'):
+                scope = self.view.scope_name(pt)
+        snapshot = ScopeSnapshot(pt, scope)
+        lazy = self.lazy_sections
 
-        if pts is None:
-            pts = sublime.Region(pt)
+        if self.context_backtrace_info and not lazy:
+            self.load_backtrace(snapshot)
 
-        row1, col1 = self.view.rowcol(pts.begin())
-        row2, col2 = self.view.rowcol(pts.end())
+        if self.highlight_extent or ((self.rowcol_info or self.points_info) and not lazy):
+            self.load_extent(snapshot, self.rowcol_info and not lazy)
 
-        # Scale back the extent by one for true points included
-        if pts.size() < self.highlight_max_size:
-            self.extents.append(sublime.Region(pts.begin(), pts.end()))
+        if self.appearance_info and not lazy:
+            self.load_style(snapshot)
 
-        if self.points_info or self.rowcol_info:
-            if self.points_info:
-                self.scope_bfr.append(ENTRY.format(PTS_KEY + ':', PTS_VALUE.format(pts.begin(), pts.end())))
-            if self.rowcol_info:
-                self.scope_bfr.append(
-                    ENTRY.format(CHAR_LINE_KEY + ':', CHAR_LINE_VALUE.format(row1 + 1, col1 + 1, row2 + 1, col2 + 1))
-                )
+        if self.rules_info and not lazy:
+            self.load_rules(snapshot)
 
-            if self.points_info:
-                self.template_vars["pt_extent"] = True
-                self.template_vars["extent_start"] = pts.begin()
-                self.template_vars["extent_end"] = pts.end()
-                self.template_vars["extent_pt_index"] = self.next_index()
-            if self.rowcol_info:
-                self.template_vars["rowcol_extent"] = True
-                self.template_vars["l_start"] = row1 + 1
-                self.template_vars["l_end"] = row2 + 1
-                self.template_vars["c_start"] = col1 + 1
-                self.template_vars["c_end"] = col2 + 1
-                self.template_vars["line_char_index"] = self.next_index()
-
-    def get_scope(self, pt):
-        """Get the scope at the cursor."""
+        return snapshot
 
-        scope = self.view.scope_name(pt)
-        spacing = "\n" + (" " * 31)
+    def load_backtrace(self, snapshot):
+        """Gather the context backtrace of the snapshot."""
 
-        if self.clipboard:
-            self.clips.append(scope)
+        if SCOPE_CONTEXT_BACKTRACE_SUPPORT and snapshot.backtrace is None:
+            with profiler.stage('context_backtrace'):
+                snapshot.backtrace = self.view.context_backtrace(snapshot.pt)
 
-        self.scope_bfr.append(ENTRY.format(SCOPE_KEY + ':', self.view.scope_name(pt).strip().replace(" ", spacing)))
+    def load_extent(self, snapshot, rowcol=True):
+        """Gather the extent of the snapshot, and optionally its row and column."""
 
-        self.template_vars['scope'] = '<br>'.join(self.view.scope_name(pt).strip().split(' '))
-        self.template_vars['scope_index'] = self.next_index()
+        with profiler.stage('extent'):
+            if snapshot.extent is None:
+                extent = extent_index.lookup(self.view, snapshot.scope, snapshot.pt)
+                if extent is None:
+                    extent = sublime.Region(snapshot.pt)
+                snapshot.extent = extent
+            if rowcol and snapshot.rowcol is None:
+                extent = snapshot.extent
+                snapshot.rowcol = (self.view.rowcol(extent.begin()), self.view.rowcol(extent.end()))
 
-        return scope
+    def load_style(self, snapshot):
+        """Gather the style of the snapshot."""
 
-    def get_scope_context_backtrace(self, pt):
-        """Get the context backtrace of the current scope."""
+        if snapshot.style is None:
+            with profiler.stage('style'):
+                snapshot.style = guess_style(self.view, snapshot.scope)
 
-        spacing = "\n" + (" " * 31)
+    def load_rules(self, snapshot):
+        """Gather the color scheme rules matching the scope of the snapshot."""
 
-        if SCOPE_CONTEXT_BACKTRACE_SUPPORT:
-            stack = list(reversed(self.view.context_backtrace(pt)))
-        else:
-            stack = []
+        if snapshot.rules is None:
+            with profiler.stage('rules'):
+                index = get_rule_index(*self.find_schemes())
+                snapshot.rules = [] if index is None else index.candidates(snapshot.scope)
+
+    def load_files(self):
+        """Gather the syntax and color scheme files."""
+
+        if not self.files_loaded:
+            with profiler.stage('files'):
+                self.scheme_file, self.overrides = self.find_schemes()
+                self.syntax_file = self.view.settings().get('syntax')
+            self.files_loaded = True
+
+    def get_extents(self, snapshot):
+        """Get the scope extent via the sublime API."""
+
+        pts = snapshot.extent
+
+        if self.points_info:
+            self.record.points = (pts.begin(), pts.end())
+            self.template_vars["pt_extent"] = True
+            self.template_vars["extent_start"] = pts.begin()
+            self.template_vars["extent_end"] = pts.end()
+        if self.rowcol_info:
+            (row1, col1), (row2, col2) = snapshot.rowcol
+            self.record.line_char = (row1 + 1, col1 + 1, row2 + 1, col2 + 1)
+            self.template_vars["rowcol_extent"] = True
+            self.template_vars["l_start"] = row1 + 1
+            self.template_vars["l_end"] = row2 + 1
+            self.template_vars["c_start"] = col1 + 1
+            self.template_vars["c_end"] = col2 + 1
+
+    def get_scope(self, snapshot):
+        """Get the scope at the cursor."""
+
+        scope = snapshot.scope.strip()
+        self.record.scope = scope
+        self.template_vars['scope'] = '<br>'.join(scope.split(' '))
+
+    def get_scope_context_backtrace(self, snapshot):
+        """Get the context backtrace of the current scope."""
 
         backtraces_text = []
         backtraces_html = []
-        for i, ctx in enumerate(reversed(stack)):
+        for i, ctx in enumerate(snapshot.backtrace):
             if SCOPE_CONTEXT_BACKTRACE_SUPPORT_v4127:
                 source_path = '{}:{}:{}'.format(ctx.source_file, *ctx.source_location)
                 display_path = '{}:{}:{}'.format(os.path.splitext(ctx.source_file)[0], *ctx.source_location)
@@ -381,27 +1042,23 @@ class GetSelectionScope:
                 backtraces_text.append(ctx)
                 backtraces_html.append(ctx)
 
-        if SCOPE_CONTEXT_BACKTRACE_SUPPORT and self.context_backtrace_info:
-            self.scope_bfr.append(ENTRY.format(CONTEXT_BACKTRACE_KEY + ':', spacing.join(backtraces_text)))
+        self.record.context_backtrace = [str(ctx) for ctx in backtraces_text]
 
-            self.template_vars['context_backtrace'] = True
-            self.template_vars["context_backtrace_stack"] = backtraces_html
-            self.template_vars['context_backtrace_index'] = self.next_index()
+        self.template_vars['context_backtrace'] = True
+        self.template_vars["context_backtrace_stack"] = backtraces_html
 
-    def get_appearance(self, color, bgcolor, style, source, line, col):
+    def get_appearance(self, snapshot):
         """Get colors of foreground, background, and font styles."""
 
-        self.source = source
-        self.line = line
-        self.column = col
+        color, bgcolor, style, self.source, self.line, self.column = snapshot.style
 
-        self.scope_bfr.append(ENTRY.format(FG_KEY + ":", color))
-        self.scope_bfr.append(ENTRY.format(BG_KEY + ":", bgcolor))
-        self.scope_bfr.append(ENTRY.format(STYLE_KEY + ":", "normal" if not style else style))
+        self.record.fg = color
+        self.record.bg = bgcolor
+        self.record.style = "normal" if not style else style
 
         self.template_vars['appearance'] = True
-        self.get_color_box(color, 'fg', self.next_index())
-        self.get_color_box(bgcolor, 'bg', self.next_index())
+        self.get_color_box(color, 'fg')
+        self.get_color_box(bgcolor, 'bg')
 
         style_label = set()
         style_open = []
@@ -431,132 +1088,209 @@ class GetSelectionScope:
         self.template_vars["style_open"] = ''.join(style_open)
         self.template_vars["style_close"] = ''.join(style_close)
         self.template_vars["style"] = ' '.join(list(style_label))
-        self.template_vars["style_index"] = self.next_index()
-
-    def find_schemes(self):
-        """Finc the syntax files."""
 
-        # Attempt syntax specific from view
-        scheme_file = self.view.settings().get('color_scheme', None)
+    def get_rules(self, snapshot):
+        """Get the color scheme rules matching the scope, best match first."""
 
-        # Get global scheme
-        if scheme_file is None:
-            pref_settings = sublime.load_settings('Preferences.sublime-settings')
-            scheme_file = pref_settings.get('color_scheme')
+        rules = []
+        for score, rule in snapshot.rules[:MAX_RULES]:
+            rules.append(
+                {
+                    'scope': rule.scope,
+                    'name': rule.name,
+                    'score': score,
+                    'source': rule.source,
+                    'index': rule.index + 1,
+                    'settings': ', '.join('{}: {}'.format(k, v) for k, v in sorted(rule.settings.items()))
+                }
+            )
 
-        if scheme_file == 'auto' and AUTO:
-            info = sublime.ui_info()
-            scheme_file = info['color_scheme']['resolved_value']
+        self.record.rules = [
+            RULE_VALUE.format(rule.scope, rule.source, rule.index + 1) for score, rule in snapshot.rules[:MAX_RULES]
+        ]
 
-        scheme_file = scheme_file.replace('\\', '/')
+        self.template_vars['scheme_rules'] = True
+        self.template_vars['rules'] = rules
+        self.template_vars['rules_hidden'] = max(0, len(snapshot.rules) - MAX_RULES)
 
-        package_overrides = []
-        user_overrides = []
-        if scheme_file.endswith('.hidden-color-scheme'):
-            pattern = '%s.hidden-color-scheme'
-        else:
-            pattern = '%s.sublime-color-scheme'
+    def find_schemes(self):
+        """Finc the syntax files."""
 
-        for override in sublime.find_resources(pattern % os.path.basename(os.path.splitext(scheme_file)[0])):
-            if override == scheme_file:
-                continue
-            if override.startswith('Packages/User/'):
-                user_overrides.append(override)
-            else:
-                package_overrides.append(override)
-        return scheme_file, package_overrides + user_overrides
+        scheme_file = get_color_scheme(self.view)
+        schemes = scheme_cache.get(scheme_file)
+        if schemes is None:
+            schemes = find_scheme_overrides(scheme_file)
+            scheme_cache[scheme_file] = schemes
+        return schemes
 
     def get_scheme_syntax(self):
         """Get color scheme and syntax file path."""
 
-        self.scheme_file, self.overrides = self.find_schemes()
-        self.syntax_file = self.view.settings().get('syntax')
-        self.scope_bfr.append(ENTRY.format(SYNTAX_KEY + ":", self.syntax_file))
-        self.scope_bfr.append(ENTRY.format(SCHEME_KEY + ":", self.scheme_file))
-        text = []
-        for idx, override in enumerate(self.overrides, 1):
-            text.append(ENTRY.format(OVERRIDE_SCHEME_KEY + (" {}:".format(idx)), override))
-        self.scope_bfr.append('\n'.join(text))
+        self.record.syntax = self.syntax_file
+        self.record.scheme = self.scheme_file
+        self.record.overrides = list(self.overrides)
 
         self.template_vars['files'] = True
         self.template_vars["syntax"] = self.syntax_file
-        self.template_vars["syntax_index"] = self.next_index()
         self.template_vars["scheme"] = self.scheme_file
-        self.template_vars["scheme_index"] = self.next_index()
         self.template_vars["overrides"] = self.overrides
-        self.template_vars["overrides_index"] = self.next_index()
-
-    def guess_style(self, scope, selected=False, no_bold=False, no_italic=False, explicit_background=False):
-        """Guess color."""
-
-        # Remove leading '.' to account for old style CSS
-        scope_style = self.view.style_for_scope(scope.lstrip('.'))
-        style = {}
-        style['foreground'] = scope_style['foreground']
-        style['background'] = scope_style.get('background')
-        style['bold'] = scope_style.get('bold', False) and not no_bold
-        style['italic'] = scope_style.get('italic', False) and not no_italic
-        style['underline'] = scope_style.get('underline', False)
-        style['glow'] = scope_style.get('glow', False)
-
-        font_styles = []
-        for k, v in style.items():
-            if k in ('bold', 'italic', 'underline', 'glow'):
-                if v is True:
-                    font_styles.append(k)
-        font_styles = ' '.join(font_styles)
-
-        defaults = self.view.style()
-        if not explicit_background and not style.get('background'):
-            style['background'] = defaults.get('background', '#FFFFFF')
-        if selected:
-            sfg = scope_style.get('selection_foreground', defaults.get('selection_foreground'))
-            if sfg != '#00000000':
-                style['foreground'] = sfg
-            style['background'] = defaults.get('selection', '#0000FF')
-
-        source = scope_style.get('source_file', '')
-        line = ''
-        col = ''
-        if source:
-            line = scope_style.get('source_line', '')
-            col = scope_style.get('source_column', '')
-
-        print("{}:{}:{}".format(source, line, col))
-
-        return SchemeColors(style['foreground'], style['background'], font_styles, source, line, col)
-
-    def get_info(self, pt):
+
+    def get_multiselect_info(self):
+        """Get scope related info for each distinct scope under the selections."""
+
+        # Group cursors that share a scope so each scope is only rendered once
+        groups = OrderedDict()
+        for sel in self.view.sel():
+            scope = self.view.scope_name(sel.b)
+            groups.setdefault(scope, []).append(sel.b)
+            if self.clipboard:
+                self.clips.append(scope)
+
+        for count, (scope, pts) in enumerate(groups.items()):
+            if count < self.max_entries:
+                snapshot = self.get_info(pts[0], scope, pts)
+                if len(self.view.sel()) == 1:
+                    self.set_displayed(snapshot)
+                pts = pts[1:]
+            if self.highlight_extent:
+                for pt in pts:
+                    extent = extent_index.lookup(self.view, scope, pt)
+                    if extent is not None and extent.size() < self.highlight_max_size:
+                        self.extents.append(extent)
+
+        self.hidden = len(groups) - self.max_entries
+
+    def set_displayed(self, snapshot):
+        """Record the scope and extent of the primary caret for `is_displayed`."""
+
+        extent = snapshot.extent
+        if extent is None:
+            extent = extent_index.lookup(self.view, snapshot.scope, snapshot.pt)
+            if extent is None:
+                extent = sublime.Region(snapshot.pt)
+        self.displayed = (snapshot.scope, extent)
+
+    def get_cursors(self, pts):
+        """Get the cursor count and positions of cursors sharing a scope."""
+
+        positions = []
+        for pt in pts[:MAX_POSITIONS]:
+            row, col = self.view.rowcol(pt)
+            positions.append(CURSOR_VALUE.format(row + 1, col + 1))
+        if len(pts) > MAX_POSITIONS:
+            positions.append('...')
+        positions = ', '.join(positions)
+
+        self.record.cursors = '{:d} ({})'.format(len(pts), positions)
+
+        self.template_vars['cursors'] = True
+        self.template_vars['cursor_count'] = len(pts)
+        self.template_vars['cursor_positions'] = positions
+
+    def get_info(self, pt, scope=None, pts=None):
         """Get scope related info."""
 
-        scope = self.get_scope(pt)
+        snapshot = self.get_snapshot(pt, scope)
+        self.entries.append((snapshot, pts))
+
+        if self.highlight_extent and snapshot.extent.size() < self.highlight_max_size:
+            self.extents.append(sublime.Region(snapshot.extent.begin(), snapshot.extent.end()))
+
+        return snapshot
+
+    def render_info(self, entry, snapshot, pts=None):
+        """Render the scope info of an entry, with the sections that haven't been gathered collapsed."""
+
+        self.template_vars['entry'] = entry
+        self.record = ScopeRecord()
+        self.records.append(self.record)
 
-        self.get_scope_context_backtrace(pt)
+        self.get_scope(snapshot)
 
-        if self.rowcol_info or self.points_info or self.highlight_extent:
-            self.get_extents(pt)
+        if pts is not None and len(pts) > 1:
+            self.get_cursors(pts)
 
-        if (self.appearance_info):
-            match = self.guess_style(scope)
-            color = match.fg
-            bgcolor = match.bg
-            style = match.style
-            if self.appearance_info:
-                self.get_appearance(color, bgcolor, style, match.source, match.line, match.col)
+        if self.context_backtrace_info and SCOPE_CONTEXT_BACKTRACE_SUPPORT:
+            if snapshot.backtrace is None:
+                self.template_vars['context_backtrace_lazy'] = True
+            else:
+                self.get_scope_context_backtrace(snapshot)
+
+        if self.points_info or self.rowcol_info:
+            if snapshot.extent is None or (self.rowcol_info and snapshot.rowcol is None):
+                self.template_vars['extent_lazy'] = True
+            else:
+                self.get_extents(snapshot)
+
+        if self.appearance_info:
+            if snapshot.style is None:
+                self.template_vars['appearance_lazy'] = True
+            else:
+                self.get_appearance(snapshot)
+
+        if self.rules_info:
+            if snapshot.rules is None:
+                self.template_vars['rules_lazy'] = True
+            else:
+                self.get_rules(snapshot)
 
         if self.file_path_info:
-            self.get_scheme_syntax()
-
-        self.scope_bfr_tool.append(
-            mdpopups.md2html(
-                self.view,
-                self.popup_template,
-                template_vars=self.template_vars,
-                template_env_options={
-                    "trim_blocks": True,
-                    "lstrip_blocks": True
-                }
-            )
+            if not self.files_loaded:
+                self.template_vars['files_lazy'] = True
+            else:
+                self.get_scheme_syntax()
+
+        with profiler.stage('template'):
+            markup = popup_template.render(self.template_vars)
+        with profiler.stage('md2html'):
+            self.scope_bfr_tool.append(mdpopups.md2html(self.view, markup))
+
+    def render(self):
+        """Render the popup and the text of all the entries."""
+
+        self.records = []
+        self.scope_bfr_tool = []
+
+        for entry, (snapshot, pts) in enumerate(self.entries):
+            if entry > 0:
+                self.scope_bfr_tool.append('\n<hr>\n')
+            self.init_template_vars()
+            self.render_info(entry, snapshot, pts)
+
+        if self.hidden > 0:
+            self.scope_bfr_tool.append(mdpopups.md2html(self.view, MORE_ENTRIES.format(self.hidden)))
+
+        if self.scheme_info or self.rules_info or self.rowcol_info or self.points_info or self.file_path_info:
+            self.scope_bfr_tool.append(mdpopups.md2html(self.view, COPY_ALL))
+
+        return ''.join(self.scope_bfr_tool)
+
+    def expand(self, section, entry):
+        """Gather the data of a collapsed section and update the popup with it."""
+
+        if get_render_token(self.view) != self.token:
+            debug('Ignoring expansion of a stale scope render')
+            return
+
+        if section == 'files':
+            self.load_files()
+        else:
+            snapshot = self.entries[entry][0]
+            if section == 'context-backtrace':
+                self.load_backtrace(snapshot)
+            elif section == 'extent':
+                self.load_extent(snapshot, self.rowcol_info)
+            elif section == 'appearance':
+                self.load_style(snapshot)
+            elif section == 'rules':
+                self.load_rules(snapshot)
+
+        mdpopups.update_popup(
+            self.view,
+            self.render(),
+            md=False,
+            css=ADD_CSS,
+            wrapper_class=('scope-hunter')
         )
 
     def on_navigate(self, href):
@@ -565,44 +1299,24 @@ class GetSelectionScope:
         params = href.split(':')
         key = params[0]
         index = int(params[1]) if len(params) > 1 else None
-        if key == 'copy-all':
-            sublime.set_clipboard('\n'.join(self.scope_bfr))
-            notify('Copied: All')
-        elif key == 'copy-scope':
-            copy_data(
-                self.scope_bfr,
-                SCOPE_KEY,
-                index,
-                lambda x: x.replace('\n' + ' ' * 31, ' ')
-            )
-        elif key == 'copy-context-backtrace':
-            copy_data(
-                self.scope_bfr,
-                CONTEXT_BACKTRACE_KEY,
-                index,
-                lambda x: x.replace('\n' + ' ' * 31, '\n')
-            )
-        elif key == 'copy-points':
-            copy_data(self.scope_bfr, PTS_KEY, index)
-        elif key == 'copy-line-char':
-            copy_data(self.scope_bfr, CHAR_LINE_KEY, index)
-        elif key == 'copy-fg':
-            copy_data(self.scope_bfr, FG_KEY, index)
-        elif key == 'copy-bg':
-            copy_data(self.scope_bfr, BG_KEY, index)
-        elif key == 'copy-style':
-            copy_data(self.scope_bfr, STYLE_KEY, index)
-        elif key == 'copy-scheme':
-            copy_data(self.scope_bfr, SCHEME_KEY, index)
-        elif key == 'copy-syntax':
-            copy_data(self.scope_bfr, SYNTAX_KEY, index)
+        if key.startswith('expand-'):
+            self.expand(key[7:], index)
+        elif key in COPY_ACTIONS:
+            label, name, fmt = COPY_ACTIONS[key]
+            value = getattr(self.records[index], name)
+            if value is not None:
+                sublime.set_clipboard(fmt(value))
+                notify("Copied: {}".format(label))
         elif key == 'copy-overrides':
-            copy_data(
-                self.scope_bfr,
-                "{} {}".format(OVERRIDE_SCHEME_KEY, params[2]),
-                index,
-                lambda text: self.overrides[int(params[2]) - 1]
-            )
+            idx = int(params[2])
+            sublime.set_clipboard(self.records[index].overrides[idx - 1])
+            notify("Copied: {} {}".format(OVERRIDE_SCHEME_KEY, idx))
+        elif key == 'copy-all':
+            sublime.set_clipboard('\n'.join(record.to_text() for record in self.records))
+            notify('Copied: All')
+        elif key == 'copy-all-json':
+            sublime.set_clipboard(json.dumps([record.to_dict() for record in self.records], indent=4))
+            notify('Copied: All (JSON)')
         elif key == 'scheme' and self.scheme_file is not None:
             window = self.view.window()
             window.run_command(
@@ -643,6 +1357,15 @@ class GetSelectionScope:
                     )
                 }
             )
+        elif key == 'rule':
+            snapshot = self.entries[index][0]
+            rule = snapshot.rules[int(params[2]) - 1][1]
+            self.view.window().run_command(
+                'open_file',
+                {
+                    "file": "${{packages}}/{}".format(rule.source.replace('Packages/', '', 1))
+                }
+            )
         elif key == 'override':
             window = self.view.window()
             window.run_command(
@@ -658,18 +1381,26 @@ class GetSelectionScope:
         """Run ScopeHunter and display in the approriate way."""
 
         self.view = v
-        self.setup(sh_settings)
+        self.token = token = get_render_token(v)
+        profiler.enabled = bool(sh_settings.get('profiling', False))
+        start = perf_counter()
+        with profiler.stage('setup'):
+            self.setup(sh_settings)
 
         self.window = self.view.window()
-        self.scope_bfr = []
+        self.records = []
         self.scope_bfr_tool = []
         self.clips = []
-        self.popup_template = sublime.load_resource('Packages/ScopeHunter/popup.j2')
+        self.entries = []
+        self.hidden = 0
         self.scheme_file = None
         self.syntax_file = None
+        self.overrides = []
+        self.files_loaded = False
         self.show_popup = bool(sh_settings.get("show_popup", False))
         self.clipboard = bool(sh_settings.get("clipboard", False))
         self.multiselect = bool(sh_settings.get("multiselect", False))
+        self.max_entries = max(1, int(sh_settings.get("multiselect_max_entries", 10)))
         self.highlight_extent = bool(sh_settings.get("highlight_extent", False))
         self.highlight_scope = sh_settings.get("highlight_scope", 'invalid')
         self.highlight_style = sh_settings.get("highlight_style", 'outline')
@@ -678,57 +1409,83 @@ class GetSelectionScope:
         self.rowcol_info = bool(sh_settings.get("extent_line_char", False))
         self.points_info = bool(sh_settings.get("extent_points", False))
         self.appearance_info = bool(sh_settings.get("styling", False))
+        self.rules_info = bool(sh_settings.get("scheme_rules", False))
         self.file_path_info = bool(sh_settings.get("file_paths", False))
+        self.lazy_sections = bool(sh_settings.get("lazy_popup_sections", False))
         self.scheme_info = self.appearance_info
         self.extents = []
 
         # Get scope info for each selection wanted
-        self.index = -1
         if len(self.view.sel()):
             if self.multiselect:
-                count = 0
-                for sel in self.view.sel():
-                    if count > 0:
-                        self.scope_bfr_tool.append('\n<hr>\n')
-                    self.init_template_vars()
-                    self.get_info(sel.b)
-                    count += 1
+                self.get_multiselect_info()
             else:
-                self.init_template_vars()
-                self.get_info(self.view.sel()[0].b)
+                snapshot = self.get_info(self.view.sel()[0].b)
+                if self.clipboard:
+                    self.clips.append(snapshot.scope)
+                self.set_displayed(snapshot)
 
-        # Copy scopes to clipboard
-        if self.clipboard:
-            sublime.set_clipboard('\n'.join(self.clips))
+        if self.file_path_info and not self.lazy_sections:
+            self.load_files()
 
-        if self.highlight_extent:
-            style = extent_style(self.highlight_style)
-            if style == 'underline':
-                self.extents = underline(self.extents)
-            self.view.add_regions(
-                'scope_hunter',
-                self.extents,
-                self.highlight_scope,
-                '',
-                style
-            )
+        if self.highlight_extent and self.highlight_style == 'thick_underline':
+            self.extents = underline(self.extents)
+
+        html = self.render()
+
+        debug('Popup template cache: {} hits, {} misses'.format(popup_template.hits, popup_template.misses))
+        if profiler.enabled:
+            profiler.record('collect', perf_counter() - start)
+
+        # Only display the results on the UI thread if the view hasn't changed since we started
+        if get_render_token(self.view) != token:
+            debug('Dropping stale scope render')
+            return
+        view = self.view
+        extents = self.extents
+        clips = '\n'.join(self.clips) if self.clipboard else None
+        sublime.set_timeout(lambda: self.display(view, token, html, extents, clips), 0)
+
+    def display(self, view, token, html, extents, clips):
+        """Display the results if they still reflect the view."""
 
-        if self.scheme_info or self.rowcol_info or self.points_info or self.file_path_info:
-            tail = mdpopups.md2html(self.view, COPY_ALL)
+        if get_render_token(view) != token or self.generation != self.session.generation:
+            debug('Dropping stale scope render')
+            return
+
+        # Ignore selection events caused by displaying the results
+        sh_thread.ignore_all = True
+
+        if self.displayed is not None:
+            self.session.displayed = (token[1], settings_generation) + self.displayed
         else:
-            tail = ''
+            self.session.displayed = None
 
-        mdpopups.show_popup(
-            self.view,
-            ''.join(self.scope_bfr_tool) + tail,
-            md=False,
-            css=ADD_CSS,
-            wrapper_class=('scope-hunter'),
-            max_width=1000, on_navigate=self.on_navigate,
-        )
+        # Copy scopes to clipboard
+        if clips is not None:
+            sublime.set_clipboard(clips)
 
+        if self.highlight_extent:
+            with profiler.stage('add_regions'):
+                view.add_regions(
+                    'scope_hunter',
+                    extents,
+                    self.highlight_scope,
+                    '',
+                    extent_style(self.highlight_style)
+                )
+
+        with profiler.stage('show_popup'):
+            mdpopups.show_popup(
+                view,
+                html,
+                md=False,
+                css=ADD_CSS,
+                wrapper_class=('scope-hunter'),
+                max_width=1000, on_navigate=self.on_navigate,
+            )
 
-get_selection_scopes = GetSelectionScope()
+        sh_thread.ignore_all = False
 
 
 class GetSelectionScopeCommand(sublime_plugin.TextCommand):
@@ -737,7 +1494,7 @@ class GetSelectionScopeCommand(sublime_plugin.TextCommand):
     def run(self, edit):
         """On demand scope request."""
 
-        sh_thread.modified = True
+        sh_thread.schedule(debounce=False)
 
     def is_enabled(self):
         """Check if we should scope this view."""
@@ -756,8 +1513,7 @@ class ToggleSelectionScopeCommand(sublime_plugin.TextCommand):
         sh_thread.instant_scoper = False
         if not self.view.settings().get('scope_hunter.view_enable', False):
             self.view.settings().set('scope_hunter.view_enable', True)
-            sh_thread.modified = True
-            sh_thread.time = time()
+            sh_thread.schedule()
         else:
             self.view.settings().set('scope_hunter.view_enable', False)
             close_display = True
@@ -779,6 +1535,32 @@ class ToggleSelectionScopeCommand(sublime_plugin.TextCommand):
                     view.erase_regions("scope_hunter")
 
 
+class ScopeHunterProfileStatsCommand(sublime_plugin.WindowCommand):
+    """Show the profiling statistics of each refresh stage."""
+
+    def run(self, output='view', reset=False):
+        """Dump the statistics to a scratch view or the console."""
+
+        if not profiler.stages:
+            notify('No profiling data (enable the "profiling" setting)')
+            return
+
+        text = profiler.report()
+        if output == 'console':
+            log('Profiling statistics\n' + text)
+        else:
+            view = self.window.new_file()
+            view.set_name('ScopeHunter - Profiling')
+            view.settings().set('gutter', False)
+            view.settings().set('word_wrap', False)
+            view.run_command('insert', {"characters": text + '\n'})
+            view.set_read_only(True)
+            view.set_scratch(True)
+
+        if reset:
+            profiler.clear()
+
+
 class SelectionScopeListener(sublime_plugin.EventListener):
     """Listern for instant scoping."""
 
@@ -803,9 +1585,58 @@ class SelectionScopeListener(sublime_plugin.EventListener):
             # clean up dirty highlights
             if enabled:
                 self.clear_regions(view)
-        else:
-            sh_thread.modified = True
-            sh_thread.time = time()
+        elif not self.is_displayed(view):
+            sh_thread.schedule()
+
+    def is_displayed(self, view):
+        """Check if the popup already shows the scope under the cursor, so there is nothing to refresh."""
+
+        session = sessions.get(view.id())
+        displayed = None if session is None else session.displayed
+        if displayed is None or displayed[:2] != (view.change_count(), settings_generation):
+            return False
+
+        sels = view.sel()
+        if not len(sels) or (len(sels) > 1 and sh_settings.get("multiselect", False)):
+            return False
+
+        pt = sels[0].b
+        scope, extent = displayed[2:]
+        return (
+            extent.contains(pt) and
+            view.scope_name(pt) == scope and
+            view.is_popup_visible()
+        )
+
+    def on_modified(self, view):
+        """Invalidate the view's scope extents."""
+
+        extent_index.invalidate(view.id())
+
+    def on_close(self, view):
+        """Drop the view's cached data."""
+
+        extent_index.invalidate(view.id())
+        size_cache.pop(view.id(), None)
+        sessions.pop(view.id(), None)
+
+    def on_post_save(self, view):
+        """Reload the popup template or color scheme styles if they were edited."""
+
+        file_name = view.file_name()
+        if not file_name:
+            return
+        file_name = file_name.replace('\\', '/')
+        if file_name.endswith('/' + POPUP_TEMPLATE[9:]):
+            popup_template.invalidate()
+        elif file_name.endswith(SCHEME_EXTENSIONS):
+            clear_scheme_cache()
+
+    def on_activated(self, view):
+        """Resolve the `auto` color scheme again as the system appearance may have changed."""
+
+        global auto_scheme
+        auto_scheme = None
 
 
 class ShThread(threading.Thread):
@@ -813,6 +1644,7 @@ class ShThread(threading.Thread):
 
     def __init__(self):
         """Setup the thread."""
+        self.condition = threading.Condition()
         self.reset()
         threading.Thread.__init__(self)
 
@@ -825,39 +1657,79 @@ class ShThread(threading.Thread):
         self.instant_scoper = False
         self.abort = False
 
+    def schedule(self, debounce=True):
+        """Request a refresh, debounced by the configured delay unless told otherwise."""
+        with self.condition:
+            self.wait_time = max(0, int(sh_settings.get('debounce_delay', 120))) / 1000.0
+            self.modified = True
+            if debounce:
+                self.time = time()
+            self.condition.notify()
+
     def payload(self):
-        """Code to run."""
-        # Ignore selection inside the routine
-        self.modified = False
-        self.ignore_all = True
+        """Code to run (on the async worker)."""
         window = sublime.active_window()
         view = None if window is None else window.active_view()
         if view is not None:
-            get_selection_scopes.run(view)
-        self.ignore_all = False
+            GetSelectionScope(get_session(view)).run(view)
         self.time = time()
 
     def is_enabled(self, view):
         """Check if we can execute."""
         return not view.settings().get("is_widget") and not self.ignore_all
 
-    def kill(self):
-        """Kill thread."""
-        self.abort = True
-        while self.is_alive():
-            pass
+    def kill(self, timeout=1.0):
+        """Kill thread and return whether it shut down within the timeout."""
+        with self.condition:
+            self.abort = True
+            self.condition.notify()
+        if self.is_alive():
+            self.join(timeout)
+            if self.is_alive():
+                # Leave `abort` set so the thread still exits once it is free
+                debug('Thread did not shut down within {} seconds'.format(timeout))
+                return False
         self.reset()
+        return True
 
     def run(self):
         """Thread loop."""
-        while not self.abort:
-            if not self.ignore_all:
-                if (
-                    self.modified is True and
-                    time() - self.time > self.wait_time
-                ):
-                    sublime.set_timeout(self.payload, 0)
-            sleep(0.5)
+        with self.condition:
+            while not self.abort:
+                if not self.modified:
+                    # Nothing to do, so sleep until a selection event arrives
+                    self.condition.wait()
+                    continue
+                remaining = self.wait_time - (time() - self.time)
+                if remaining > 0:
+                    # Debounce: further events push `time` forward and restart the wait
+                    self.condition.wait(remaining)
+                    continue
+                self.modified = False
+                sublime.set_timeout_async(self.payload, 0)
+
+
+def on_settings_change():
+    """Invalidate anything that depends on the settings."""
+
+    global settings_generation
+    settings_generation += 1
+    popup_template.invalidate()
+
+
+def on_preferences_change():
+    """Invalidate anything that depends on the color scheme or font settings."""
+
+    global settings_generation
+    settings_generation += 1
+    clear_scheme_cache()
+    size_cache.clear()
+
+
+def on_packages_change():
+    """Invalidate anything that depends on installed packages."""
+
+    clear_scheme_cache()
 
 
 def init_plugin():
@@ -865,13 +1737,23 @@ def init_plugin():
 
     global sh_thread
     global pref_settings
+    global pc_settings
     global sh_settings
 
     # Preferences Settings
     pref_settings = sublime.load_settings('Preferences.sublime-settings')
+    pref_settings.clear_on_change('scope_hunter_reload')
+    pref_settings.add_on_change('scope_hunter_reload', on_preferences_change)
+
+    # Package Control settings (track packages being installed or removed)
+    pc_settings = sublime.load_settings('Package Control.sublime-settings')
+    pc_settings.clear_on_change('scope_hunter_reload')
+    pc_settings.add_on_change('scope_hunter_reload', on_packages_change)
 
     # Setup settings
     sh_settings = sublime.load_settings('scope_hunter.sublime-settings')
+    sh_settings.clear_on_change('scope_hunter_reload')
+    sh_settings.add_on_change('scope_hunter_reload', on_settings_change)
 
     # Setup thread
     if sh_thread is not None:
@@ -890,4 +1772,7 @@ def plugin_loaded():
 def plugin_unloaded():
     """Kill the thread."""
 
+    sh_settings.clear_on_change('scope_hunter_reload')
+    pref_settings.clear_on_change('scope_hunter_reload')
+    pc_settings.clear_on_change('scope_hunter_reload')
     sh_thread.kill()
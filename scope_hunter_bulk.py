@@ -0,0 +1,640 @@
+"""
+Scope Hunter.
+
+Licensed under MIT
+Copyright (c) 2012 - 2016 Isaac Muse <isaacmuse@gmail.com>
+"""
+import sublime
+import sublime_plugin
+import threading
+import os
+from ScopeHunter.scope_hunter_notify import notify, error
+from ScopeHunter.lib.scope_map import Coalescer, FORMATS, diff, format_diff
+from ScopeHunter.lib.scope_cache import ScopeMapCache, content_hash, make_key
+from ScopeHunter.lib.scope_stats import ScopeStats
+from ScopeHunter.scope_hunter import guess_style
+
+TOKEN_SUPPORT = hasattr(sublime.View, 'extract_tokens_with_scopes')
+
+# Number of lines scoped per step on the async worker
+CHUNK_LINES = 500
+
+# Largest file counted by folder scope stats
+MAX_STATS_FILE_SIZE = 2 * 1024 * 1024
+
+DIFF_KEY = 'scope_hunter_diff'
+DIFF_PANEL = 'scope_hunter_diff'
+STATS_PANEL = 'scope_hunter_stats'
+
+walkers = {}
+folder_stats = {}
+snapshots = {}
+scope_cache = None
+
+
+def get_scope_cache(enabled_only=True):
+    """Get the scope map cache, or `None` if it is disabled."""
+
+    global scope_cache
+
+    if scope_cache is None:
+        scope_cache = ScopeMapCache(os.path.join(sublime.cache_path(), 'ScopeHunter', 'scopes'), 0)
+    size = sublime.load_settings('scope_hunter.sublime-settings').get('scope_cache_size', 50)
+    scope_cache.max_size = int(max(0, size or 0) * 1024 * 1024)
+    return scope_cache if scope_cache.max_size or not enabled_only else None
+
+
+def get_cache_key(view):
+    """Get the scope map cache key of the view: the syntax, the syntax content, and the view content."""
+
+    syntax = view.settings().get('syntax')
+    if not syntax:
+        return None
+    try:
+        syntax_hash = content_hash(sublime.load_resource(syntax))
+    except Exception:
+        return None
+    return make_key(
+        syntax, syntax_hash, content_hash(view.substr(sublime.Region(0, view.size()))), sublime.version()
+    )
+
+
+def find_walker(view):
+    """Find the walk running on the view, or writing to it, or the folder scope stats running in its window."""
+
+    walker = walkers.get(view.id())
+    if walker is None:
+        window = view.window()
+        walker = folder_stats.get(window.id()) if window is not None else None
+    if walker is None:
+        for w in list(walkers.values()):
+            if w.output is not None and w.output.id() == view.id():
+                walker = w
+                break
+    return walker
+
+
+def extract_tokens(view, region):
+    """Get the `(begin, end, scope)` tokens of the region."""
+
+    begin = region.begin()
+    end = region.end()
+    if TOKEN_SUPPORT:
+        tokens = []
+        for r, scope in view.extract_tokens_with_scopes(region):
+            # Clip tokens to the region, the next chunk picks up the rest
+            token_begin = max(begin, r.begin())
+            token_end = min(end, r.end())
+            if token_begin < token_end:
+                tokens.append((token_begin, token_end, scope))
+        return tokens
+    return [(pt, pt + 1, view.scope_name(pt)) for pt in range(begin, end)]
+
+
+class ScopeWalker:
+    """
+    Walk the scopes of a whole view on the async worker.
+
+    The view is scoped a chunk of lines at a time, and each step yields the worker before scheduling the next one,
+    so walks can be cancelled and don't hold up other async work. Subclasses consume the run length encoded extents.
+    """
+
+    label = 'Scoping'
+    # Whether walks read scope maps from the cache
+    use_cache = True
+    # Whether walks store the scope maps they collect in the cache
+    store_cache = True
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
+        self.output = None
+        self.cancelled = threading.Event()
+        self.coalescer = Coalescer()
+        self.row = 0
+        self.cache = None
+        self.cache_key = None
+        self.collected = None
+        self.size = view.size()
+        self.last_row = view.rowcol(self.size)[0]
+        self.change_count = view.change_count()
+
+    def start(self):
+        """Start walking the view, replacing any walk already running on it."""
+
+        running = walkers.get(self.view.id())
+        if running is not None:
+            running.cancel()
+        walkers[self.view.id()] = self
+        sublime.set_timeout_async(self.step, 0)
+
+    def cancel(self):
+        """Cancel the walk."""
+
+        self.cancelled.set()
+
+    def is_valid(self):
+        """Check if the views involved in the walk are still open."""
+
+        return self.view.is_valid() and (self.output is None or self.output.is_valid())
+
+    def stop(self):
+        """Stop tracking the walk."""
+
+        if walkers.get(self.view.id()) is self:
+            del walkers[self.view.id()]
+
+    def step(self):
+        """Scope the next chunk of lines."""
+
+        if self.cancelled.is_set() or not self.is_valid():
+            self.stop()
+            self.on_cancel()
+            notify('{} cancelled'.format(self.label))
+            return
+
+        if self.view.change_count() != self.change_count:
+            self.stop()
+            self.on_cancel()
+            notify('{} cancelled, the view was modified'.format(self.label))
+            return
+
+        if self.row == 0 and self.load_cache():
+            return
+
+        begin = self.view.text_point(self.row, 0)
+        self.row += CHUNK_LINES
+        done = self.row > self.last_row
+        end = self.size if done else self.view.text_point(self.row, 0)
+
+        extents = self.coalescer.feed(extract_tokens(self.view, sublime.Region(begin, end)))
+        if done:
+            extents.extend(self.coalescer.flush())
+        if self.collected is not None:
+            self.collected.extend(extents)
+        self.on_extents(extents)
+
+        if done:
+            self.stop()
+            if self.collected is not None:
+                self.cache.set(self.cache_key, self.collected)
+                self.collected = None
+            self.on_done()
+        else:
+            sublime.status_message(
+                'ScopeHunter: {}... {:d}%'.format(self.label, int(end * 100 / max(1, self.size)))
+            )
+            sublime.set_timeout_async(self.step, 0)
+
+    def load_cache(self):
+        """Load the scope map from the cache, if it is there, and finish the walk."""
+
+        if not self.use_cache:
+            return False
+        self.cache = get_scope_cache()
+        if self.cache is None:
+            return False
+        self.cache_key = get_cache_key(self.view)
+        if self.cache_key is None:
+            return False
+
+        extents = self.cache.get(self.cache_key)
+        if extents is None:
+            if self.store_cache:
+                self.collected = []
+            return False
+
+        self.on_extents(extents)
+        self.stop()
+        self.on_done()
+        return True
+
+    def on_extents(self, extents):
+        """Handle a batch of extents."""
+
+    def on_done(self):
+        """Handle completion."""
+
+    def on_cancel(self):
+        """Handle cancellation."""
+
+
+class ScopeDump(ScopeWalker):
+    """Stream the extents of a view to a scratch view or a file."""
+
+    label = 'Dumping scopes'
+
+    def __init__(self, view, fmt, output=None, path=None):
+        """Initialize."""
+
+        super().__init__(view)
+        self.header, self.formatter = FORMATS[fmt]
+        self.output = output
+        self.path = path
+        self.file = None
+        self.count = 0
+
+    def start(self):
+        """Open the file and start."""
+
+        if self.path is not None:
+            self.file = open(self.path, 'w', encoding='utf-8', newline='\n')
+        self.write(self.header)
+        super().start()
+
+    def write(self, text):
+        """Write text to the output."""
+
+        if not text:
+            return
+        if self.file is not None:
+            self.file.write(text)
+        else:
+            output = self.output
+            sublime.set_timeout(
+                lambda: output.run_command('append', {'characters': text, 'force': True, 'scroll_to_end': False}),
+                0
+            )
+
+    def close(self):
+        """Close the file."""
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def on_extents(self, extents):
+        """Write the extents."""
+
+        self.count += len(extents)
+        self.write(''.join([self.formatter(extent) for extent in extents]))
+
+    def on_done(self):
+        """Finish the output."""
+
+        self.close()
+        notify('Dumped {:d} scope extents{}'.format(self.count, '' if self.path is None else ' to ' + self.path))
+
+    def on_cancel(self):
+        """Close the output."""
+
+        self.close()
+
+
+class ScopeCollector(ScopeWalker):
+    """
+    Collect the scope map of a view and hand it to a callback.
+
+    Snapshots and diffs exist to catch syntax edits, including edits to syntaxes that the cache key doesn't cover
+    (extended or embedded syntaxes), so they always scope the view instead of using the cache.
+    """
+
+    use_cache = False
+    store_cache = False
+
+    def __init__(self, view, callback, label='Scoping'):
+        """Initialize."""
+
+        super().__init__(view)
+        self.label = label
+        self.callback = callback
+        self.extents = []
+
+    def on_extents(self, extents):
+        """Collect the extents."""
+
+        self.extents.extend(extents)
+
+    def on_done(self):
+        """Hand off the scope map."""
+
+        self.callback(self.change_count, self.extents)
+
+
+def show_diff(view, changes):
+    """Highlight the changed extents in the view and list them in an output panel."""
+
+    window = view.window()
+    view.add_regions(
+        DIFF_KEY,
+        [sublime.Region(change[0], change[1]) for change in changes],
+        'region.orangish',
+        '',
+        sublime.DRAW_NO_FILL
+    )
+
+    name = os.path.basename(view.file_name() or view.name() or 'untitled')
+    text = ['Scope diff of {}: {:d} changed extents\n\n'.format(name, len(changes))]
+    for change in changes:
+        text.append(format_diff(change, *view.rowcol(change[0])))
+
+    if window is not None:
+        panel = window.create_output_panel(DIFF_PANEL)
+        panel.settings().set('word_wrap', False)
+        panel.run_command('append', {'characters': ''.join(text), 'force': True, 'scroll_to_end': False})
+        window.run_command('show_panel', {'panel': 'output.' + DIFF_PANEL})
+
+
+class ScopeStatsWalker(ScopeWalker):
+    """
+    Count the scopes of a view.
+
+    The scope maps are not kept (or cached), so memory only grows with the number of distinct scopes.
+    """
+
+    label = 'Counting scopes'
+    store_cache = False
+
+    def __init__(self, view, stats, unstyled, callback):
+        """Initialize."""
+
+        super().__init__(view)
+        self.stats = stats
+        self.unstyled = unstyled
+        self.callback = callback
+
+    def on_extents(self, extents):
+        """Count the extents."""
+
+        self.stats.feed(extents)
+
+    def on_done(self):
+        """Check the styles of the new scopes and hand off the stats."""
+
+        self.stats.files += 1
+        default = self.view.style().get('foreground', '').lower()
+        for scope in self.stats.scopes:
+            if scope not in self.unstyled:
+                self.unstyled[scope] = guess_style(self.view, scope).fg.lower() == default
+        self.callback()
+
+    def on_cancel(self):
+        """Hand off the stats counted so far."""
+
+        self.callback(cancelled=True)
+
+
+class FolderScopeStats:
+    """Count the scopes of the files in a folder, opening each file headlessly in an output panel."""
+
+    label = 'Counting scopes'
+
+    def __init__(self, window, folder):
+        """Initialize."""
+
+        self.window = window
+        self.folder = folder
+        self.files = self.iter_files()
+        self.stats = ScopeStats()
+        self.unstyled = {}
+        self.walker = None
+        self.cancelled = threading.Event()
+
+    def iter_files(self):
+        """Get the files of the folder, skipping hidden folders and big files."""
+
+        for root, dirs, files in os.walk(self.folder):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getsize(path) <= MAX_STATS_FILE_SIZE:
+                        yield path
+                except OSError:
+                    pass
+
+    def start(self):
+        """Start counting, replacing any count already running in the window."""
+
+        running = folder_stats.get(self.window.id())
+        if running is not None:
+            running.cancel()
+        folder_stats[self.window.id()] = self
+        sublime.set_timeout_async(self.next_file, 0)
+
+    def cancel(self):
+        """Cancel counting."""
+
+        self.cancelled.set()
+        if self.walker is not None:
+            self.walker.cancel()
+
+    def stop(self):
+        """Stop tracking the count and clean up the panel."""
+
+        if folder_stats.get(self.window.id()) is self:
+            del folder_stats[self.window.id()]
+        self.window.destroy_output_panel(STATS_PANEL)
+
+    def next_file(self, cancelled=False):
+        """Count the scopes of the next file with a syntax."""
+
+        if cancelled or self.cancelled.is_set():
+            self.stop()
+            self.report(True)
+            return
+
+        for path in self.files:
+            syntax = sublime.find_syntax_for_file(path)
+            if syntax is None or syntax.scope == 'text.plain':
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except Exception:
+                continue
+
+            sublime.status_message('ScopeHunter: {}... {}'.format(self.label, os.path.relpath(path, self.folder)))
+            view = self.window.create_output_panel(STATS_PANEL)
+            view.assign_syntax(syntax)
+            view.run_command('append', {'characters': text, 'force': True, 'scroll_to_end': False})
+            self.walker = ScopeStatsWalker(view, self.stats, self.unstyled, self.next_file)
+            self.walker.start()
+            return
+
+        self.stop()
+        self.report(False)
+
+    def report(self, cancelled):
+        """Show the report."""
+
+        name = self.folder + (' (cancelled)' if cancelled else '')
+        show_stats(self.window, self.stats, self.unstyled, name)
+
+
+def show_stats(window, stats, unstyled, name):
+    """Show a scope stats report in a new scratch view."""
+
+    text = stats.report(name, {scope.strip() for scope, default in unstyled.items() if default})
+
+    def show():
+        view = window.new_file()
+        view.set_name('ScopeHunter - Scope Stats')
+        view.set_scratch(True)
+        view.settings().set('word_wrap', False)
+        view.run_command('append', {'characters': text, 'force': True, 'scroll_to_end': False})
+        view.set_read_only(True)
+
+    sublime.set_timeout(show, 0)
+
+
+class ScopeHunterScopeStatsCommand(sublime_plugin.TextCommand):
+    """Report the character and extent counts of the scopes of the view."""
+
+    def run(self, edit):
+        """Count the scopes."""
+
+        view = self.view
+        window = view.window()
+        stats = ScopeStats()
+        unstyled = {}
+        name = os.path.basename(view.file_name() or view.name() or 'untitled')
+
+        def done(cancelled=False):
+            if not cancelled:
+                show_stats(window, stats, unstyled, name)
+
+        ScopeStatsWalker(view, stats, unstyled, done).start()
+
+
+class ScopeHunterFolderScopeStatsCommand(sublime_plugin.WindowCommand):
+    """Report the character and extent counts of the scopes of the files in a folder."""
+
+    def run(self, folder=None):
+        """Count the scopes of the folder, asking for the folder if one isn't given."""
+
+        if folder is None:
+            folders = self.window.folders()
+            self.window.show_input_panel(
+                'Folder:', folders[0] if folders else '', lambda value: self.run(value), None, None
+            )
+            return
+
+        folder = os.path.expanduser(folder)
+        if not os.path.isdir(folder):
+            error('Not a folder: {}'.format(folder))
+            return
+        FolderScopeStats(self.window, folder).start()
+
+
+class ScopeHunterScopeSnapshotCommand(sublime_plugin.TextCommand):
+    """Snapshot the scope map of the view to diff against later."""
+
+    def run(self, edit):
+        """Collect the scope map."""
+
+        view = self.view
+        view.erase_regions(DIFF_KEY)
+
+        def store(change_count, extents):
+            snapshots[view.id()] = (change_count, extents)
+            notify('Scope snapshot taken: {:d} scope extents'.format(len(extents)))
+
+        ScopeCollector(view, store, 'Taking scope snapshot').start()
+
+
+class ScopeHunterScopeDiffCommand(sublime_plugin.TextCommand):
+    """Diff the current scope map of the view against its snapshot."""
+
+    def run(self, edit):
+        """Collect the scope map and diff it against the snapshot."""
+
+        view = self.view
+        snapshot = snapshots.get(view.id())
+        if snapshot is None:
+            error('No scope snapshot has been taken for this view')
+            return
+
+        def compare(change_count, extents):
+            if change_count != snapshot[0]:
+                error('The view was modified after the scope snapshot was taken, take a new snapshot')
+                return
+            changes = diff(snapshot[1], extents)
+            sublime.set_timeout(lambda: show_diff(view, changes), 0)
+            notify('Scope diff: {:d} changed extents'.format(len(changes)))
+
+        ScopeCollector(view, compare, 'Diffing scopes').start()
+
+    def is_enabled(self):
+        """Check if the view has a snapshot."""
+
+        return self.view.id() in snapshots
+
+
+class ScopeHunterClearScopeDiffCommand(sublime_plugin.TextCommand):
+    """Clear the scope diff highlights and snapshot of the view."""
+
+    def run(self, edit):
+        """Clear the highlights and snapshot."""
+
+        self.view.erase_regions(DIFF_KEY)
+        snapshots.pop(self.view.id(), None)
+        window = self.view.window()
+        if window is not None:
+            window.destroy_output_panel(DIFF_PANEL)
+
+
+class ScopeHunterDumpScopesCommand(sublime_plugin.TextCommand):
+    """Dump the scope extents of the whole view."""
+
+    def run(self, edit, output='view', fmt='tsv', path=None):
+        """Start streaming the scope extents to a scratch view or a file."""
+
+        if fmt not in FORMATS:
+            error('Unknown scope dump format: {}'.format(fmt))
+            return
+
+        if output == 'file':
+            if path is None:
+                file_name = self.view.file_name()
+                if file_name is None:
+                    error('A path is required to dump the scopes of an unsaved view')
+                    return
+                path = '{}.scopes.{}'.format(file_name, fmt)
+            ScopeDump(self.view, fmt, path=os.path.expanduser(path)).start()
+        else:
+            window = self.view.window()
+            out = window.new_file()
+            out.set_name('ScopeHunter - Scopes: {}'.format(os.path.basename(self.view.file_name() or self.view.name())))
+            out.set_scratch(True)
+            out.settings().set('word_wrap', False)
+            ScopeDump(self.view, fmt, output=out).start()
+
+
+class ScopeHunterCancelCommand(sublime_plugin.TextCommand):
+    """Cancel the whole view scope walk running on (or writing to) the view."""
+
+    def run(self, edit):
+        """Cancel the walk."""
+
+        walker = find_walker(self.view)
+        if walker is not None:
+            walker.cancel()
+
+    def is_enabled(self):
+        """Check if a walk is running on the view."""
+
+        return find_walker(self.view) is not None
+
+
+class ScopeHunterClearScopeCacheCommand(sublime_plugin.ApplicationCommand):
+    """Clear the scope map cache."""
+
+    def run(self):
+        """Remove all cached scope maps."""
+
+        get_scope_cache(enabled_only=False).clear()
+        notify('Scope cache cleared')
+
+
+class ScopeWalkListener(sublime_plugin.EventListener):
+    """Clean up whole view scope walks and snapshots of closed views."""
+
+    def on_close(self, view):
+        """Cancel walks and drop the snapshot of the view."""
+
+        walker = walkers.get(view.id())
+        if walker is not None:
+            walker.cancel()
+        snapshots.pop(view.id(), None)
@@ -0,0 +1,4 @@
+"""Run the benchmarks."""
+from .bench_pipeline import main
+
+main()
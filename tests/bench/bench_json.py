@@ -0,0 +1,126 @@
+"""
+Benchmark sanitizing JSON with comments and dangling commas.
+
+Run with `python -m tests.bench.bench_json` from the repository root, see `--help` for options.
+"""
+import argparse
+import random
+import timeit
+from . import harness
+
+RULE = '''        // {name}
+        {{
+            "name": "{name}",
+            "scope": "{scope}", /* rule {index} */
+            "foreground": "var(color{color})",
+            "font_style": "{style}",
+        }},
+'''
+
+
+def make_json(size, seed=0):
+    """Generate a color scheme like JSON document of roughly `size` characters."""
+
+    rand = random.Random(seed)
+    parts = ['// Generated\n{\n    "variables": {\n']
+    for i in range(16):
+        parts.append('        "color{}": "#{:06x}", // color\n'.format(i, rand.randint(0, 0xFFFFFF)))
+    parts.append('    },\n    "rules": [\n')
+    total = sum(len(p) for p in parts)
+    index = 0
+    while total < size:
+        scope = ' '.join(harness.SCOPES[rand.randint(0, len(harness.SCOPES) - 1)].split()[1:]) or 'source'
+        rule = RULE.format(
+            name='Rule "{}" // /* quoted */'.format(index).replace('"', '\\"'),
+            scope=scope,
+            index=index,
+            color=rand.randint(0, 15),
+            style=rand.choice(('bold', 'italic', ''))
+        )
+        parts.append(rule)
+        total += len(rule)
+        index += 1
+    parts.append('    ],\n}\n')
+    return ''.join(parts)
+
+
+def bench_sanitize_json(file_strip_json, text):
+    """Benchmark the single pass sanitizer."""
+
+    def run():
+        file_strip_json.sanitize_json(text)
+
+    return run
+
+
+def bench_two_pass(file_strip_json, text):
+    """Benchmark stripping comments and then dangling commas in separate passes."""
+
+    def run():
+        file_strip_json.strip_dangling_commas(file_strip_json.strip_comments(text))
+
+    return run
+
+
+def bench_sanitize_json_preserve_lines(file_strip_json, text):
+    """Benchmark the single pass sanitizer preserving lines."""
+
+    def run():
+        file_strip_json.sanitize_json(text, True)
+
+    return run
+
+
+def bench_two_pass_preserve_lines(file_strip_json, text):
+    """Benchmark stripping comments and then dangling commas in separate passes preserving lines."""
+
+    def run():
+        file_strip_json.strip_dangling_commas(file_strip_json.strip_comments(text, True), True)
+
+    return run
+
+
+BENCHMARKS = (
+    ('sanitize_json', bench_sanitize_json),
+    ('two_pass', bench_two_pass),
+    ('sanitize_json_lines', bench_sanitize_json_preserve_lines),
+    ('two_pass_lines', bench_two_pass_preserve_lines),
+)
+
+
+def run_benchmarks(size=4 * 1024 * 1024, repeat=3, number=1, names=None):
+    """Run the benchmarks and return `(name, best, mean)` timings in milliseconds per call."""
+
+    file_strip_json = harness.load_module('lib.file_strip.json')
+    text = make_json(size)
+
+    results = []
+    for name, bench in BENCHMARKS:
+        if names and name not in names:
+            continue
+        fn = bench(file_strip_json, text)
+        times = [t / number * 1000 for t in timeit.repeat(fn, repeat=repeat, number=number)]
+        results.append((name, min(times), sum(times) / len(times)))
+    return results
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line."""
+
+    parser = argparse.ArgumentParser(
+        prog='python -m tests.bench.bench_json', description='Benchmark sanitizing JSON.'
+    )
+    parser.add_argument('--size', type=int, default=4 * 1024 * 1024, help='Size of the JSON in characters.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timing runs.')
+    parser.add_argument('--number', type=int, default=1, help='Calls per timing run.')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run (default all).')
+    args = parser.parse_args(argv)
+
+    print('size={}'.format(args.size))
+    print('{:20} {:>12} {:>12}'.format('benchmark', 'best (ms)', 'mean (ms)'))
+    for name, best, mean in run_benchmarks(args.size, args.repeat, args.number, args.names):
+        print('{:20} {:>12.4f} {:>12.4f}'.format(name, best, mean))
+
+
+if __name__ == '__main__':
+    main()
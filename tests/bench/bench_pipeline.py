@@ -0,0 +1,140 @@
+"""
+Benchmark ScopeHunter's hot paths.
+
+Run with `python -m tests.bench` from the repository root, see `--help` for options.
+"""
+import argparse
+import timeit
+from . import harness
+
+
+def bench_run(plugin, view):
+    """Benchmark a full refresh with warm caches."""
+
+    def run():
+        plugin.GetSelectionScope(plugin.get_session(view)).run(view)
+
+    return run
+
+
+def bench_run_cold(plugin, view):
+    """Benchmark a full refresh after the buffer was modified."""
+
+    def run():
+        view.change += 1
+        plugin.extent_index.invalidate(view.id())
+        plugin.GetSelectionScope(plugin.get_session(view)).run(view)
+
+    return run
+
+
+def bench_run_lazy(plugin, view):
+    """Benchmark a full refresh with warm caches and collapsed popup sections."""
+
+    values = plugin.sh_settings.values
+
+    def run():
+        lazy = values.get('lazy_popup_sections', False)
+        values['lazy_popup_sections'] = True
+        try:
+            plugin.GetSelectionScope(plugin.get_session(view)).run(view)
+        finally:
+            values['lazy_popup_sections'] = lazy
+
+    return run
+
+
+def bench_extent_lookup(plugin, view):
+    """Benchmark extent lookups for every cursor."""
+
+    pts = [(sel.b, view.scope_name(sel.b)) for sel in view.sel()]
+
+    def run():
+        for pt, scope in pts:
+            plugin.extent_index.lookup(view, scope, pt)
+
+    return run
+
+
+def bench_underline(plugin, view):
+    """Benchmark splitting all extents of the buffer into per character regions."""
+
+    regions = [r for scope in harness.SCOPES for r in view.find_by_selector(scope)]
+
+    def run():
+        plugin.underline(regions)
+
+    return run
+
+
+def bench_extent_style(plugin, view):
+    """Benchmark resolving every highlight style."""
+
+    styles = ('outline', 'none', 'underline', 'thin_underline', 'squiggly', 'stippled', 'thick_underline', 'solid')
+
+    def run():
+        for style in styles:
+            plugin.extent_style(style)
+
+    return run
+
+
+def bench_template(plugin, view):
+    """Benchmark rendering the popup template for the first cursor."""
+
+    render = plugin.GetSelectionScope(plugin.get_session(view))
+    render.run(view)
+    render.init_template_vars()
+    render.render_info(0, render.entries[0][0])
+    template_vars = render.template_vars
+
+    def run():
+        plugin.popup_template.render(template_vars)
+
+    return run
+
+
+BENCHMARKS = (
+    ('run', bench_run),
+    ('run_cold', bench_run_cold),
+    ('run_lazy', bench_run_lazy),
+    ('extent_lookup', bench_extent_lookup),
+    ('underline', bench_underline),
+    ('extent_style', bench_extent_style),
+    ('template', bench_template),
+)
+
+
+def run_benchmarks(size=100000, cursors=1, repeat=5, number=10, names=None, settings=None):
+    """Run the benchmarks and return `(name, best, mean)` timings in milliseconds per call."""
+
+    plugin = harness.load_plugin(settings)
+    view = harness.make_view(size, cursors)
+
+    results = []
+    for name, bench in BENCHMARKS:
+        if names and name not in names:
+            continue
+        fn = bench(plugin, view)
+        # Warm up caches
+        fn()
+        times = [t / number * 1000 for t in timeit.repeat(fn, repeat=repeat, number=number)]
+        results.append((name, min(times), sum(times) / len(times)))
+    return results
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line."""
+
+    parser = argparse.ArgumentParser(prog='python -m tests.bench', description='Benchmark ScopeHunter hot paths.')
+    parser.add_argument('--size', type=int, default=100000, help='Size of the synthetic buffer in characters.')
+    parser.add_argument('--cursors', type=int, default=1, help='Number of cursors.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timing runs.')
+    parser.add_argument('--number', type=int, default=10, help='Calls per timing run.')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run (default all).')
+    args = parser.parse_args(argv)
+
+    print('size={} cursors={}'.format(args.size, args.cursors))
+    print('{:16} {:>12} {:>12}'.format('benchmark', 'best (ms)', 'mean (ms)'))
+    for name, best, mean in run_benchmarks(args.size, args.cursors, args.repeat, args.number, args.names):
+        print('{:16} {:>12.4f} {:>12.4f}'.format(name, best, mean))
@@ -0,0 +1,56 @@
+"""
+Minimal in-process stand-in for `mdpopups`.
+
+Markdown conversion is not benchmarked (it belongs to `mdpopups`), so `md2html`
+only escapes the text, keeping the cost proportional to the content.
+"""
+import html
+
+
+def version():
+    """Get the version."""
+
+    return (4, 2, 2)
+
+
+def md2html(view, markup, template_vars=None, template_env_options=None, **kwargs):
+    """Convert Markdown to HTML."""
+
+    return '<div>{}</div>'.format(html.escape(markup, quote=False))
+
+
+def color_box(colors, border='#000000ff', border2=None, height=32, width=32, border_size=1, check_size=4, **kwargs):
+    """Get a color box."""
+
+    return '<span style="background: {}; border: {}px solid {}; width: {}px; height: {}px;"></span>'.format(
+        colors[0], border_size, border, width, height
+    )
+
+
+def show_popup(view, content, md=True, css=None, on_navigate=None, **kwargs):
+    """Show a popup."""
+
+    view.popup = (content, on_navigate)
+
+
+def update_popup(view, content, md=True, css=None, **kwargs):
+    """Update the popup."""
+
+    if view.popup is not None:
+        view.popup = (content, view.popup[1])
+
+
+def hide_popup(view):
+    """Hide the popup."""
+
+    view.popup = None
+
+
+def format_frontmatter(values):
+    """Format frontmatter."""
+
+    return ''
+
+
+def add_phantom(*args, **kwargs):
+    """Add a phantom."""
@@ -0,0 +1,73 @@
+"""Minimal stand-in for the `coloraide` `Color` class shipped with `mdpopups` (sRGB hex and HSL only)."""
+import colorsys
+
+
+class Color:
+    """Color."""
+
+    def __init__(self, color, filters=None):
+        """Initialize from a hex color or `transparent`."""
+
+        if isinstance(color, Color):
+            self.space = color.space
+            self.coords = list(color.coords)
+            self.alpha = color.alpha
+            return
+        self.space = 'srgb'
+        if color == 'transparent':
+            self.coords = [0.0, 0.0, 0.0]
+            self.alpha = 0.0
+            return
+        value = color.lstrip('#')
+        if len(value) in (3, 4):
+            value = ''.join(c * 2 for c in value)
+        self.coords = [int(value[i:i + 2], 16) / 255 for i in (0, 2, 4)]
+        self.alpha = int(value[6:8], 16) / 255 if len(value) == 8 else 1.0
+
+    def convert(self, space):
+        """Convert to `srgb` or `hsl`."""
+
+        color = Color(self)
+        if space == self.space:
+            return color
+        if space == 'hsl':
+            h, l, s = colorsys.rgb_to_hls(*self.coords)
+            color.coords = [h * 360, s * 100, l * 100]
+        else:
+            h, s, l = self.coords
+            color.coords = list(colorsys.hls_to_rgb(h / 360, l / 100, s / 100))
+        color.space = space
+        return color
+
+    def fit(self, space='srgb', in_place=False):
+        """Clamp the color to the sRGB gamut."""
+
+        color = self if in_place else Color(self)
+        if color.space == 'srgb':
+            color.coords = [min(1.0, max(0.0, c)) for c in color.coords]
+        return color
+
+    def luminance(self):
+        """Get the relative luminance."""
+
+        r, g, b = self.convert('srgb').coords
+        return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+    def __getitem__(self, key):
+        """Get a channel."""
+
+        return self.coords['hsl'.index(key)] if self.space == 'hsl' else self.coords['rgb'.index(key)]
+
+    def __setitem__(self, key, value):
+        """Set a channel."""
+
+        self.coords[('hsl' if self.space == 'hsl' else 'rgb').index(key)] = value
+
+    def to_string(self, hex=False, alpha=True, **kwargs):  # noqa: A002
+        """Serialize as hex."""
+
+        r, g, b = (round(min(1.0, max(0.0, c)) * 255) for c in self.convert('srgb').coords)
+        value = '#{:02x}{:02x}{:02x}'.format(r, g, b)
+        if alpha:
+            value += '{:02x}'.format(round(self.alpha * 255))
+        return value
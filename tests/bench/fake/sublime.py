@@ -0,0 +1,621 @@
+"""
+Minimal in-process stand-in for the Sublime Text `sublime` API.
+
+Only what ScopeHunter uses is provided, and views are backed by a synthetic
+token list (see `tests.bench.harness`) so that scope queries behave like the
+real API without a running editor.
+"""
+import bisect
+import fnmatch
+import os
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+HIDE_ON_MINIMAP = 1 << 0
+DRAW_EMPTY = 1 << 1
+HIDDEN = 1 << 2
+DRAW_EMPTY_AS_OVERWRITE = 1 << 3
+DRAW_NO_FILL = 1 << 4
+DRAW_NO_OUTLINE = 1 << 5
+DRAW_SOLID_UNDERLINE = 1 << 6
+DRAW_STIPPLED_UNDERLINE = 1 << 7
+DRAW_SQUIGGLY_UNDERLINE = 1 << 8
+ENCODED_POSITION = 1
+TRANSIENT = 4
+
+_clipboard = ''
+# Extra resources by name (`Packages/...`), for resources outside the repository
+resources = {}
+_settings = {}
+_windows = []
+
+
+def version():
+    """Get the Sublime Text version."""
+
+    return '4200'
+
+
+def platform():
+    """Get the platform."""
+
+    return 'linux'
+
+
+def arch():
+    """Get the architecture."""
+
+    return 'x64'
+
+
+def packages_path():
+    """Get the packages path."""
+
+    return os.path.dirname(ROOT)
+
+
+def installed_packages_path():
+    """Get the installed packages path."""
+
+    return os.path.join(os.path.dirname(ROOT), 'Installed Packages')
+
+
+def executable_path():
+    """Get the executable path."""
+
+    return os.path.join(os.path.dirname(ROOT), 'sublime_text')
+
+
+def cache_path():
+    """Get the cache path."""
+
+    return os.path.join(tempfile.gettempdir(), 'ScopeHunterBench', 'Cache')
+
+
+def set_timeout(callback, delay=0):
+    """Run the callback immediately."""
+
+    callback()
+
+
+def set_timeout_async(callback, delay=0):
+    """Run the callback immediately."""
+
+    callback()
+
+
+def set_clipboard(text):
+    """Set the clipboard."""
+
+    global _clipboard
+    _clipboard = text
+
+
+def get_clipboard():
+    """Get the clipboard."""
+
+    return _clipboard
+
+
+def status_message(msg):
+    """Show a status message."""
+
+
+def error_message(msg):
+    """Show an error message."""
+
+
+def message_dialog(msg):
+    """Show a message dialog."""
+
+
+def run_command(cmd, args=None):
+    """Run an application command."""
+
+
+def command_url(cmd, args=None):
+    """Get a command URL."""
+
+    return 'subl:{} {}'.format(cmd, args or {})
+
+
+def expand_variables(value, variables):
+    """Expand variables."""
+
+    for k, v in variables.items():
+        value = value.replace('${{{}}}'.format(k), v)
+    return value
+
+
+def ui_info():
+    """Get the UI info."""
+
+    return {'color_scheme': {'resolved_value': 'Packages/Color Scheme - Default/Mariana.sublime-color-scheme'}}
+
+
+def load_resource(name):
+    """Load resources from the repository (`Packages/ScopeHunter/...`) or `resources`."""
+
+    if name in resources:
+        return resources[name]
+    if name.startswith('Packages/ScopeHunter/'):
+        with open(os.path.join(ROOT, name[21:]), encoding='utf-8') as f:
+            return f.read()
+    raise OSError('resource not found: {}'.format(name))
+
+
+def find_resources(pattern):
+    """Find the resources whose file names match the pattern."""
+
+    return [r for r in resources if fnmatch.fnmatchcase(r.rsplit('/', 1)[-1], pattern)]
+
+
+class Syntax:
+    """Syntax."""
+
+    def __init__(self, path, name, scope):
+        """Initialize."""
+
+        self.path = path
+        self.name = name
+        self.scope = scope
+
+
+SYNTAXES = {
+    '.py': Syntax('Packages/Python/Python.sublime-syntax', 'Python', 'source.python'),
+    '.txt': Syntax('Packages/Text/Plain text.tmLanguage', 'Plain Text', 'text.plain'),
+}
+
+
+def find_syntax_for_file(path, first_line=''):
+    """Find the syntax for a file by extension."""
+
+    return SYNTAXES.get(os.path.splitext(path)[1])
+
+
+class Settings:
+    """Settings object."""
+
+    def __init__(self, values=None):
+        """Initialize."""
+
+        self.values = dict(values or {})
+        self.callbacks = {}
+
+    def get(self, key, default=None):
+        """Get a setting."""
+
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        """Set a setting."""
+
+        self.values[key] = value
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def has(self, key):
+        """Check for a setting."""
+
+        return key in self.values
+
+    def erase(self, key):
+        """Erase a setting."""
+
+        self.values.pop(key, None)
+
+    def add_on_change(self, tag, callback):
+        """Add change callback."""
+
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        """Clear change callback."""
+
+        self.callbacks.pop(tag, None)
+
+
+def load_settings(name):
+    """Load settings by name."""
+
+    if name not in _settings:
+        _settings[name] = Settings()
+    return _settings[name]
+
+
+class Region:
+    """Region."""
+
+    __slots__ = ('a', 'b', 'xpos')
+
+    def __init__(self, a, b=None, xpos=-1):
+        """Initialize."""
+
+        self.a = a
+        self.b = a if b is None else b
+        self.xpos = xpos
+
+    def __repr__(self):
+        """Representation."""
+
+        return 'Region({}, {})'.format(self.a, self.b)
+
+    def __eq__(self, other):
+        """Equality."""
+
+        return isinstance(other, Region) and self.a == other.a and self.b == other.b
+
+    def __hash__(self):
+        """Hash."""
+
+        return hash((self.a, self.b))
+
+    def __len__(self):
+        """Size."""
+
+        return self.size()
+
+    def begin(self):
+        """Start of region."""
+
+        return min(self.a, self.b)
+
+    def end(self):
+        """End of region."""
+
+        return max(self.a, self.b)
+
+    def size(self):
+        """Size."""
+
+        return abs(self.b - self.a)
+
+    def empty(self):
+        """Check if empty."""
+
+        return self.a == self.b
+
+    def contains(self, x):
+        """Check if the point or region is contained."""
+
+        if isinstance(x, Region):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        return self.begin() <= x <= self.end()
+
+
+class Selection(list):
+    """Selection."""
+
+    def add(self, region):
+        """Add a region."""
+
+        self.append(region)
+
+
+class ContextStackFrame:
+    """Context backtrace frame."""
+
+    __slots__ = ('context_name', 'source_file', 'source_location')
+
+    def __init__(self, context_name, source_file, source_location):
+        """Initialize."""
+
+        self.context_name = context_name
+        self.source_file = source_file
+        self.source_location = source_location
+
+
+STYLE = {
+    'foreground': '#cdd3de',
+    'background': '#303841',
+    'selection': '#4e5a65',
+    'selection_foreground': '#00000000',
+    'redish': '#ec5f66',
+}
+
+
+class View:
+    """
+    View backed by a list of `(length, scope)` tokens.
+
+    Scope lookups bisect the token list, and `find_by_selector` accepts a full scope
+    name (which is all ScopeHunter passes) and returns a fresh list of merged extents.
+    """
+
+    _next_id = 1
+    base_scope = 'text.plain '
+
+    def __init__(self, text, tokens, window=None):
+        """Initialize."""
+
+        self._id = View._next_id
+        View._next_id += 1
+        self.text = text
+        self.name_ = ''
+        self.window_ = window
+        self.change = 0
+        self._settings = Settings(
+            {
+                'syntax': 'Packages/Python/Python.sublime-syntax',
+                'color_scheme': 'Mariana.sublime-color-scheme'
+            }
+        )
+        self.selection = Selection([Region(0)])
+        self.regions = {}
+        self.popup = None
+        self.set_tokens(tokens)
+        self.line_starts = [0] + [i + 1 for i, c in enumerate(text) if c == '\n']
+
+    def set_tokens(self, tokens):
+        """Set the tokens and index them."""
+
+        self.tokens = list(tokens)
+        self.starts = []
+        self.scopes = []
+        self.by_scope = {}
+        pt = 0
+        for length, scope in tokens:
+            if self.scopes and self.scopes[-1] == scope:
+                last = self.by_scope[scope][-1]
+                last.b = pt + length
+            else:
+                self.starts.append(pt)
+                self.scopes.append(scope)
+                self.by_scope.setdefault(scope, []).append(Region(pt, pt + length))
+            pt += length
+
+    def id(self):
+        """View ID."""
+
+        return self._id
+
+    def is_valid(self):
+        """Check if the view is valid."""
+
+        return True
+
+    def name(self):
+        """View name."""
+
+        return self.name_
+
+    def set_name(self, name):
+        """Set the view name."""
+
+        self.name_ = name
+
+    def set_scratch(self, scratch):
+        """Set scratch."""
+
+    def set_read_only(self, read_only):
+        """Set read only."""
+
+    def run_command(self, cmd, args=None):
+        """Run a text command (only `append` is supported, appended text gets the syntax's base scope)."""
+
+        if cmd == 'append':
+            start = len(self.text)
+            chars = args['characters']
+            self.text += chars
+            self.line_starts.extend(start + i + 1 for i, c in enumerate(chars) if c == '\n')
+            self.set_tokens(self.tokens + [(len(chars), self.base_scope)])
+            self.change += 1
+
+    def assign_syntax(self, syntax):
+        """Assign the syntax."""
+
+        self._settings.set('syntax', syntax.path)
+        self.base_scope = syntax.scope + ' '
+
+    def window(self):
+        """Window."""
+
+        return self.window_
+
+    def change_count(self):
+        """Change count."""
+
+        return self.change
+
+    def size(self):
+        """Size of buffer."""
+
+        return len(self.text)
+
+    def substr(self, x):
+        """Get buffer text."""
+
+        if isinstance(x, Region):
+            return self.text[x.begin():x.end()]
+        return self.text[x:x + 1]
+
+    def settings(self):
+        """View settings."""
+
+        return self._settings
+
+    def sel(self):
+        """Selection."""
+
+        return self.selection
+
+    def line_height(self):
+        """Line height."""
+
+        return 20
+
+    def scope_name(self, pt):
+        """Get the scope at the point."""
+
+        i = bisect.bisect_right(self.starts, pt) - 1
+        return self.scopes[max(0, min(i, len(self.scopes) - 1))]
+
+    def find_by_selector(self, selector):
+        """Find regions matching the full scope name."""
+
+        return [Region(r.a, r.b) for r in self.by_scope.get(selector, [])]
+
+    def extract_tokens_with_scopes(self, region):
+        """Get the tokens (and their scopes) that intersect the region."""
+
+        begin = region.begin()
+        end = region.end()
+        i = max(0, bisect.bisect_right(self.starts, begin) - 1)
+        tokens = []
+        while i < len(self.starts) and self.starts[i] < end:
+            token_end = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.text)
+            tokens.append((Region(max(begin, self.starts[i]), min(end, token_end)), self.scopes[i]))
+            i += 1
+        return tokens
+
+    def context_backtrace(self, pt):
+        """Get the context backtrace."""
+
+        return [
+            ContextStackFrame('main', 'Packages/Python/Python.sublime-syntax', (1, 1)),
+            ContextStackFrame(self.scope_name(pt).split()[-1], 'Packages/Python/Python.sublime-syntax', (10, 5))
+        ]
+
+    def style(self):
+        """Get the global style."""
+
+        return dict(STYLE)
+
+    def style_for_scope(self, scope):
+        """Get the style of the scope (base scopes are unstyled)."""
+
+        if len(scope.split()) == 1:
+            return {'foreground': STYLE['foreground']}
+        value = sum(ord(c) for c in scope) % 0xFFFFFF
+        return {
+            'foreground': '#{:06x}'.format(value),
+            'bold': 'keyword' in scope,
+            'italic': 'comment' in scope,
+            'source_file': 'Packages/Color Scheme - Default/Mariana.sublime-color-scheme',
+            'source_line': 10,
+            'source_column': 5
+        }
+
+    def rowcol(self, pt):
+        """Get the row and column of the point."""
+
+        row = bisect.bisect_right(self.line_starts, pt) - 1
+        return row, pt - self.line_starts[row]
+
+    def text_point(self, row, col):
+        """Get the point of the row and column."""
+
+        return self.line_starts[row] + col
+
+    def add_regions(self, key, regions, scope='', icon='', flags=0):
+        """Add regions."""
+
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        """Get regions."""
+
+        return self.regions.get(key, [])
+
+    def erase_regions(self, key):
+        """Erase regions."""
+
+        self.regions.pop(key, None)
+
+    def is_popup_visible(self):
+        """Check if the popup is visible."""
+
+        return self.popup is not None
+
+    def file_name(self):
+        """File name."""
+
+        return None
+
+    def is_loading(self):
+        """Check if loading."""
+
+        return False
+
+
+class Window:
+    """Window."""
+
+    _next_id = 1
+
+    def __init__(self):
+        """Initialize."""
+
+        self._id = Window._next_id
+        Window._next_id += 1
+        self.views = []
+        self.panels = {}
+        self.active = None
+        self.folders_ = []
+
+    def id(self):
+        """Window ID."""
+
+        return self._id
+
+    def folders(self):
+        """Project folders."""
+
+        return self.folders_
+
+    def show_input_panel(self, caption, initial_text, on_done, on_change, on_cancel):
+        """Show an input panel (accepts the initial text)."""
+
+        on_done(initial_text)
+
+    def active_view(self):
+        """Active view."""
+
+        return self.active
+
+    def new_file(self):
+        """Create a new empty view."""
+
+        view = View('', [])
+        view.window_ = self
+        self.views.append(view)
+        self.active = view
+        return view
+
+    def create_output_panel(self, name):
+        """Create (or clear) an output panel."""
+
+        panel = View('', [])
+        panel.window_ = self
+        self.panels[name] = panel
+        return panel
+
+    def destroy_output_panel(self, name):
+        """Destroy an output panel."""
+
+        self.panels.pop(name, None)
+
+    def focus_view(self, view):
+        """Focus the view."""
+
+        self.active = view
+
+    def extract_variables(self):
+        """Variables."""
+
+        return {'packages': packages_path()}
+
+    def run_command(self, cmd, args=None):
+        """Run a window command."""
+
+    def status_message(self, msg):
+        """Status message."""
+
+
+def active_window():
+    """Active window."""
+
+    if not _windows:
+        _windows.append(Window())
+    return _windows[0]
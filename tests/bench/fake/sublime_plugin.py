@@ -0,0 +1,36 @@
+"""Minimal in-process stand-in for the Sublime Text `sublime_plugin` API."""
+
+
+class EventListener:
+    """Event listener."""
+
+
+class ViewEventListener:
+    """View event listener."""
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
+
+
+class ApplicationCommand:
+    """Application command."""
+
+
+class WindowCommand:
+    """Window command."""
+
+    def __init__(self, window):
+        """Initialize."""
+
+        self.window = window
+
+
+class TextCommand:
+    """Text command."""
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
@@ -0,0 +1,116 @@
+"""
+Benchmark harness.
+
+Loads ScopeHunter against the fake `sublime`, `sublime_plugin`, and `mdpopups`
+modules in `fake`, and builds synthetic views of a given size and cursor count.
+"""
+import importlib
+import json
+import os
+import random
+import sys
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE = os.path.join(HERE, 'fake')
+ROOT = os.path.dirname(os.path.dirname(HERE))
+
+SCOPES = (
+    'source.python ',
+    'source.python keyword.control.flow.python ',
+    'source.python meta.function.python storage.type.function.python ',
+    'source.python meta.function.python entity.name.function.python ',
+    'source.python meta.function-call.python variable.function.python ',
+    'source.python string.quoted.double.python ',
+    'source.python string.quoted.double.python constant.character.escape.python ',
+    'source.python comment.line.number-sign.python ',
+    'source.python constant.numeric.integer.decimal.python ',
+    'source.python keyword.operator.assignment.python ',
+    'source.python punctuation.section.group.begin.python ',
+    'source.python punctuation.section.group.end.python ',
+)
+
+# Show everything so every stage of the pipeline runs
+ALL_INFO = {
+    'context_backtrace': True,
+    'extent_points': True,
+    'extent_line_char': True,
+    'styling': True,
+    'file_paths': True,
+    'highlight_extent': True,
+    'multiselect': True,
+}
+
+
+def load_module(name):
+    """Import a ScopeHunter module (`ScopeHunter.<name>`) against the fake API."""
+
+    if FAKE not in sys.path:
+        sys.path.insert(0, FAKE)
+    if 'ScopeHunter' not in sys.modules:
+        package = types.ModuleType('ScopeHunter')
+        package.__path__ = [ROOT]
+        sys.modules['ScopeHunter'] = package
+    return importlib.import_module('ScopeHunter.' + name)
+
+
+def load_plugin(settings=None):
+    """Import ScopeHunter against the fake API and configure its settings."""
+
+    plugin = load_module('scope_hunter')
+
+    import sublime
+    from ScopeHunter.lib.file_strip.json import sanitize_json
+
+    with open(os.path.join(ROOT, 'scope_hunter.sublime-settings'), encoding='utf-8') as f:
+        values = json.loads(sanitize_json(f.read()))
+    values.update(ALL_INFO if settings is None else settings)
+
+    plugin.sh_settings = sublime.load_settings('scope_hunter.sublime-settings')
+    plugin.sh_settings.values = values
+    plugin.pref_settings = sublime.load_settings('Preferences.sublime-settings')
+    # The refresh thread is never started, benchmarks drive the pipeline directly
+    plugin.sh_thread = plugin.ShThread()
+    return plugin
+
+
+def make_tokens(size, seed=0):
+    """Generate `(text, tokens)` for a synthetic buffer of roughly `size` characters."""
+
+    rand = random.Random(seed)
+    text = []
+    tokens = []
+    total = 0
+    column = 0
+    while total < size:
+        if column > 60:
+            length = 1
+            text.append('\n')
+            tokens.append((1, SCOPES[0]))
+            column = 0
+        else:
+            length = rand.randint(1, 12)
+            scope = rand.choice(SCOPES)
+            text.append('x' * length)
+            tokens.append((length, scope))
+            column += length
+        total += length
+    return ''.join(text), tokens
+
+
+def make_view(size, cursors=1, seed=0):
+    """Create an active view with a synthetic buffer and evenly spread cursors."""
+
+    import sublime
+
+    text, tokens = make_tokens(size, seed)
+    window = sublime.active_window()
+    view = sublime.View(text, tokens, window)
+    window.views.append(view)
+    window.active = view
+
+    view.selection = sublime.Selection()
+    step = max(1, len(text) // max(1, cursors))
+    for i in range(cursors):
+        view.selection.add(sublime.Region(min(len(text), i * step + step // 2)))
+    return view
@@ -0,0 +1,36 @@
+"""Test the benchmark harness."""
+import json
+import unittest
+from .bench import bench_json
+from .bench import bench_pipeline
+from .bench import harness
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Test that the hot paths run against the fake API."""
+
+    def test_refresh(self):
+        """Test that a refresh shows a popup and highlights every cursor."""
+
+        plugin = harness.load_plugin()
+        view = harness.make_view(2000, cursors=4)
+        plugin.GetSelectionScope(plugin.get_session(view)).run(view)
+
+        self.assertIsNotNone(view.popup)
+        self.assertEqual(len(view.get_regions('scope_hunter')), 4)
+
+    def test_benchmarks(self):
+        """Run each benchmark once on a small buffer."""
+
+        results = bench_pipeline.run_benchmarks(size=2000, cursors=4, repeat=1, number=1)
+        self.assertEqual([r[0] for r in results], [b[0] for b in bench_pipeline.BENCHMARKS])
+
+    def test_json_benchmarks(self):
+        """Test that the JSON benchmarks run and sanitize the generated JSON."""
+
+        results = bench_json.run_benchmarks(size=2000, repeat=1, number=1)
+        self.assertEqual([r[0] for r in results], [b[0] for b in bench_json.BENCHMARKS])
+
+        file_strip_json = harness.load_module('lib.file_strip.json')
+        obj = json.loads(file_strip_json.sanitize_json(bench_json.make_json(2000)))
+        self.assertTrue(obj['rules'])
@@ -0,0 +1,159 @@
+"""Test file stripping."""
+import random
+import unittest
+from .bench import harness
+
+file_strip_json = harness.load_module('lib.file_strip.json')
+file_strip_comments = harness.load_module('lib.file_strip.comments')
+
+# Fragments that exercise strings, comments, and dangling commas in awkward combinations
+FRAGMENTS = (
+    '"a"', "'b'", '"c\\"d"', '"/* not */"', '"// not"', "'it\\'s'", '"',
+    '/* c */', '/* multi\nline */', '/**/', '/* * / */', '// line', '//', '/',
+    ',', ', ', ',\n', ']', '}', '[', '{', ':', ' ', '  ', '\n', '\r\n', '\t',
+    '1', 'true', 'x', '\\', '*',
+)
+
+# Extra fragments for the other comment styles
+STYLE_FRAGMENTS = FRAGMENTS + ('#', '# line', '"""', "'''", '""', "''", '\r')
+
+
+def two_pass(text, preserve_lines=False):
+    """Sanitize JSON the old way, stripping comments and then dangling commas."""
+
+    return file_strip_json.strip_dangling_commas(file_strip_json.strip_comments(text, preserve_lines), preserve_lines)
+
+
+class TestSanitizeJson(unittest.TestCase):
+    """Test that the single pass sanitizer matches stripping comments and dangling commas separately."""
+
+    def test_examples(self):
+        """Test typical settings content."""
+
+        text = '''
+        // Settings
+        {
+            "a": [1, 2, 3,],  // trailing
+            "b": {"c": "/* string */", /* comment */ "d": "// string",
+                  /* before */ },
+            'e': 'f', // last
+        }
+        '''
+        for preserve_lines in (False, True):
+            self.assertEqual(
+                file_strip_json.sanitize_json(text, preserve_lines),
+                two_pass(text, preserve_lines)
+            )
+        self.assertEqual(
+            file_strip_json.sanitize_json('{"a": [1, /* x */ 2, // y\n], }'),
+            '{"a": [1,  2]}'
+        )
+
+    def test_random(self):
+        """Test random combinations of awkward fragments."""
+
+        rand = random.Random(0)
+        for _ in range(3000):
+            text = ''.join(rand.choice(FRAGMENTS) for _ in range(rand.randint(1, 12)))
+            for preserve_lines in (False, True):
+                self.assertEqual(
+                    file_strip_json.sanitize_json(text, preserve_lines),
+                    two_pass(text, preserve_lines),
+                    '{!r} (preserve_lines={})'.format(text, preserve_lines)
+                )
+
+
+def split(rand, text, count):
+    """Split text into chunks at random places."""
+
+    cuts = sorted(rand.randint(0, len(text)) for _ in range(count))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+class TestIterStrip(unittest.TestCase):
+    """Test that streaming comment stripping matches stripping the whole text."""
+
+    def test_chunks(self):
+        """Test comments and strings split across chunks."""
+
+        comments = file_strip_comments.Comments('json')
+        chunks = ['{"a": "x /', '* y", /', '* comment ', '*', '/ "b": 1, ', ' /', '/ line\n}']
+        pieces = list(comments.iter_strip(iter(chunks)))
+        self.assertEqual(''.join(pieces), comments.strip(''.join(chunks)))
+        self.assertEqual(''.join(pieces), '{"a": "x /* y",  "b": 1,  \n}')
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual(''.join(file_strip_json.iter_strip_comments(chunks)), ''.join(pieces))
+
+        comments = file_strip_comments.Comments('python', True)
+        chunks = ['a = """x # ', 'y"""  #', ' z\nb = "#"\n']
+        self.assertEqual(''.join(comments.iter_strip(chunks)), 'a = """x # y"""\nb = "#"\n')
+
+    def test_open_tokens(self):
+        """Test that comments and strings spanning hundreds of chunks are only tokenized again once they end."""
+
+        class Pattern(object):
+            """Count the characters tokenized."""
+
+            def __init__(self, pattern):
+                self.pattern = pattern
+                self.count = 0
+
+            def finditer(self, text):
+                self.count += len(text)
+                return self.pattern.finditer(text)
+
+        size = 400 * 1024
+        cases = (
+            ('json', '{"a": "' + 'x\\"y ' * (size // 5) + '"}\n'),
+            ('json', '/* ' + 'a * b\n' * (size // 6) + '*/ {}\n'),
+            ('json', '{} // ' + 'x' * size + '\n'),
+            ('css', 'a { } /* ' + 'x' * size + '*/'),
+            ('python', 'x = """' + 'a"b""c\\\n' * (size // 8) + '"""\n# c\n'),
+            ('python', "x = '" + 'a\\\'b' * (size // 4) + "'\n"),
+        )
+        for style, text in cases:
+            comments = file_strip_comments.Comments(style)
+            pattern = Pattern(
+                {'json': file_strip_comments.CPP_PATTERN, 'css': file_strip_comments.CSS_PATTERN}.get(
+                    style, file_strip_comments.PY_PATTERN
+                )
+            )
+            tail, kinds = {
+                'json': (file_strip_comments.CPP_TAIL, file_strip_comments.CPP_OPEN),
+                'css': (file_strip_comments.CSS_TAIL, file_strip_comments.CSS_OPEN),
+                'python': (file_strip_comments.PY_TAIL, file_strip_comments.PY_OPEN)
+            }[style]
+            chunks = [text[i:i + 1024] for i in range(0, len(text), 1024)]
+            self.assertGreater(len(chunks), 300)
+            result = ''.join(file_strip_comments._iter_strip_regex(pattern, tail, kinds, chunks, False))
+            self.assertEqual(result, comments.strip(text))
+            self.assertLess(pattern.count, len(text) * 3, style)
+
+    def test_python_strings(self):
+        """Test that Python strings end at the first closing quotes, so each docstring streams on its own."""
+
+        comments = file_strip_comments.Comments('python')
+        text = 'def a():\n    """A."""  # one\n\n\ndef b():\n    """B."""  # two\n    return \'it\\\'s\'  # three\n'
+        self.assertEqual(
+            comments.strip(text),
+            'def a():\n    """A."""\n\n\ndef b():\n    """B."""\n    return \'it\\\'s\'\n'
+        )
+        pieces = list(comments.iter_strip(text[i:i + 8] for i in range(0, len(text), 8)))
+        self.assertEqual(''.join(pieces), comments.strip(text))
+        self.assertGreater(len(pieces), 5)
+
+    def test_random(self):
+        """Test random texts split at random places."""
+
+        rand = random.Random(0)
+        for _ in range(1000):
+            text = ''.join(rand.choice(STYLE_FRAGMENTS) for _ in range(rand.randint(1, 16)))
+            chunks = split(rand, text, rand.randint(0, 6))
+            for style in ('json', 'python', 'css'):
+                for preserve_lines in (False, True):
+                    comments = file_strip_comments.Comments(style, preserve_lines)
+                    self.assertEqual(
+                        ''.join(comments.iter_strip(chunks)),
+                        comments.strip(text),
+                        '{} {!r} (preserve_lines={})'.format(style, chunks, preserve_lines)
+                    )
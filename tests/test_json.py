@@ -1,8 +1,11 @@
 """Test JSON."""
 import unittest
 from . import validate_json_format
+import contextlib
+import io
 import os
 import fnmatch
+import tempfile
 
 
 class TestSettings(unittest.TestCase):
@@ -14,7 +17,7 @@ class TestSettings(unittest.TestCase):
         for root, dirnames, filenames in os.walk(folder):
             for filename in fnmatch.filter(filenames, pattern):
                 yield os.path.join(root, filename)
-            dirnames[:] = [d for d in dirnames if d not in ('.svn', '.git', '.tox')]
+            dirnames[:] = [d for d in dirnames if d not in ('.svn', '.git', '.tox', '.venv', 'venv', 'site')]
 
     def test_json_settings(self):
         """Test each JSON file."""
@@ -25,7 +28,13 @@ class TestSettings(unittest.TestCase):
             '*.sublime-commands',
             '*.sublime-menu',
             '*.sublime-theme',
-            '*.sublime-color-scheme'
+            '*.sublime-color-scheme',
+            '*.sublime-build',
+            '*.sublime-completions',
+            '*.sublime-macro',
+            '*.sublime-mousemap',
+            '*.sublime-project',
+            '*.json'
         )
 
         for pattern in patterns:
@@ -34,3 +43,39 @@ class TestSettings(unittest.TestCase):
                     validate_json_format.CheckJsonFormat(False, True).check_format(f),
                     "%s does not comform to expected format!" % f
                 )
+
+    def test_violation_lines(self):
+        """Test that violations are reported on their lines in the original file."""
+
+        text = (
+            '{\n'
+            '    /* a block\n'
+            '       comment */\n'
+            '    "a": [1, 2,], // line comment\n'
+            '    "b": "/* not a comment */",\n'
+            '    /* x */ "c": {"d": 1,\n'
+            '    },\n'
+            '}'
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, 'test.json')
+            with open(name, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                fail = validate_json_format.CheckJsonFormat(False, False).check_format(name)
+
+        self.assertTrue(fail)
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            [
+                'W2: Line 8 - Missing a new line at the end of the file.',
+                'W3: Line 8 - Indentation Error.',
+                'E1: Line 2 - Comments are not part of the JSON spec.',
+                'E1: Line 4 - Comments are not part of the JSON spec.',
+                'E1: Line 6 - Comments are not part of the JSON spec.',
+                'E2: Line 4 - Dangling comma found.',
+                'E2: Line 6 - Dangling comma found.',
+                'E2: Line 7 - Dangling comma found.'
+            ]
+        )
@@ -0,0 +1,168 @@
+"""Test the plugin's popup, sessions, and refresh decisions."""
+import json
+import unittest
+from unittest import mock
+from .bench import harness
+
+
+def show_scope(plugin=None, settings=None, size=2000, **kwargs):
+    """Show the scope info of a new view, loading the plugin if one is not given."""
+
+    if plugin is None:
+        plugin = harness.load_plugin(settings)
+    view = harness.make_view(size, **kwargs)
+    render = plugin.GetSelectionScope(plugin.get_session(view))
+    render.run(view)
+    return plugin, view, render
+
+
+class TestPopup(unittest.TestCase):
+    """Test popup sections and copy links."""
+
+    def test_lazy_sections(self):
+        """Test that collapsed popup sections are gathered and shown when expanded."""
+
+        plugin, view, render = show_scope(settings=dict(harness.ALL_INFO, lazy_popup_sections=True))
+
+        html, on_navigate = view.popup
+        for section in ('context-backtrace', 'extent', 'appearance', 'files'):
+            self.assertIn('expand-{}:0'.format(section), html)
+        self.assertNotIn('copy-fg', html)
+
+        on_navigate('expand-appearance:0')
+        html = view.popup[0]
+        self.assertIn('copy-fg', html)
+        self.assertNotIn('expand-appearance:0', html)
+        self.assertIn('expand-extent:0', html)
+
+        on_navigate('expand-files:0')
+        self.assertIn('copy-syntax', view.popup[0])
+
+    def test_copy(self):
+        """Test that copy links copy the fields of their entry."""
+
+        import sublime
+
+        plugin, view, render = show_scope(cursors=4)
+        on_navigate = view.popup[1]
+        scopes = []
+        for sel in view.sel():
+            scope = view.scope_name(sel.b).strip()
+            if scope not in scopes:
+                scopes.append(scope)
+
+        on_navigate('copy-scope:{}'.format(len(scopes) - 1))
+        self.assertEqual(sublime.get_clipboard(), scopes[-1])
+        on_navigate('copy-points:0')
+        self.assertRegex(sublime.get_clipboard(), r'^\(\d+, \d+\)$')
+
+        on_navigate('copy-all')
+        text = sublime.get_clipboard()
+        self.assertEqual(text.count('Scope:'), len(scopes))
+        self.assertIn('Scope Extents (Line:Char):', text)
+
+        on_navigate('copy-all-json')
+        records = json.loads(sublime.get_clipboard())
+        self.assertEqual([record['scope'] for record in records], scopes)
+        self.assertEqual(len(records[0]['points']), 2)
+        self.assertIn('syntax', records[0])
+
+
+class TestRefresh(unittest.TestCase):
+    """Test when refreshes are skipped or dropped."""
+
+    def test_extent_index(self):
+        """Test that extents are only indexed once a scope is looked up again before the next edit."""
+
+        plugin = harness.load_plugin()
+        view = harness.make_view(2000)
+        index = plugin.ScopeExtentIndex()
+        scope = view.scope_name(0)
+        pts = [pt for pt in range(view.size()) if view.scope_name(pt) == scope]
+        extents = [plugin.find_extent(view.find_by_selector(scope), pt, view.size()) for pt in pts]
+
+        self.assertEqual(index.lookup(view, scope, 0), extents[0])
+        self.assertIsNone(index.get_scopes(view)[scope][0])
+        self.assertEqual([index.lookup(view, scope, pt) for pt in pts], extents)
+        self.assertIsNotNone(index.get_scopes(view)[scope][0])
+
+        view.change += 1
+        self.assertEqual(len(index.get_scopes(view)), 0)
+
+    def test_is_displayed(self):
+        """Test that caret moves within the shown scope extent skip the refresh."""
+
+        import sublime
+
+        plugin, view, render = show_scope()
+        listener = plugin.SelectionScopeListener()
+        self.assertTrue(listener.is_displayed(view))
+
+        extent = plugin.sessions[view.id()].displayed[3]
+        view.selection = sublime.Selection([sublime.Region(extent.a)])
+        self.assertTrue(listener.is_displayed(view))
+        pt = extent.b if extent.b < view.size() else extent.a - 1
+        view.selection = sublime.Selection([sublime.Region(pt)])
+        self.assertFalse(listener.is_displayed(view))
+
+    def test_is_displayed_no_extent(self):
+        """Test that caret moves to another token of the shown scope refresh when no extent was gathered."""
+
+        import sublime
+
+        settings = dict(
+            harness.ALL_INFO, highlight_extent=False, extent_points=False, extent_line_char=False, multiselect=False
+        )
+        plugin, view, render = show_scope(settings=settings)
+        listener = plugin.SelectionScopeListener()
+        self.assertTrue(listener.is_displayed(view))
+
+        scope, extent = plugin.sessions[view.id()].displayed[2:]
+        pt = next(pt for pt in range(view.size()) if view.scope_name(pt) == scope and not extent.contains(pt))
+        view.selection = sublime.Selection([sublime.Region(pt)])
+        self.assertFalse(listener.is_displayed(view))
+
+    def test_stale_render(self):
+        """Test that renders are dropped if the view or the session moved on before they are displayed."""
+
+        import sublime
+
+        def changes(plugin, view):
+            view.change += 1
+
+        def moves(plugin, view):
+            view.selection = sublime.Selection([sublime.Region(0)])
+
+        def rerenders(plugin, view):
+            plugin.GetSelectionScope(plugin.get_session(view))
+
+        for change in (changes, moves, rerenders):
+            posted = []
+            with mock.patch.object(sublime, 'set_timeout', lambda callback, delay=0: posted.append(callback)):
+                plugin, view, render = show_scope()
+            self.assertEqual(len(posted), 1)
+
+            change(plugin, view)
+            posted[0]()
+            self.assertIsNone(view.popup, change.__name__)
+            self.assertEqual(view.get_regions('scope_hunter'), [], change.__name__)
+
+
+class TestSessions(unittest.TestCase):
+    """Test that each view keeps its own scope data."""
+
+    def test_sessions(self):
+        """Test that renders of different views keep their own records for copy actions."""
+
+        import sublime
+
+        plugin = harness.load_plugin()
+        views, renders = zip(*(show_scope(plugin, seed=seed)[1:] for seed in (1, 2)))
+        scopes = [view.scope_name(view.sel()[0].b).strip() for view in views]
+        self.assertNotEqual(scopes[0], scopes[1])
+        self.assertIsNot(renders[0].session, renders[1].session)
+        self.assertIsNot(renders[0].records, renders[1].records)
+
+        for view, scope in zip(views, scopes):
+            view.popup[1]('copy-scope:0')
+            self.assertEqual(sublime.get_clipboard(), scope)
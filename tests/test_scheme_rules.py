@@ -0,0 +1,172 @@
+"""Test color scheme rule attribution."""
+import json
+import unittest
+from .bench import harness
+
+scheme_rules = harness.load_module('lib.scheme_rules')
+
+SCHEME = '''
+// Test scheme
+{
+    "variables": {
+        "red": "#ff0000",
+        "accent": "var(red)",
+    },
+    "rules": [
+        {"name": "Strings", "scope": "string", "foreground": "var(accent)"},
+        {"scope": "string.quoted.double", "font_style": "bold"},
+        {"scope": "source.python string"},
+        {"scope": "string - string.quoted.double"},
+        {"scope": "comment, punctuation.definition.comment"},
+        {"scope": "(keyword | storage) & source.python"},
+        {"scope": "-comment"},
+        {"scope": "meta.function-call variable.function"},
+    ]
+}
+'''
+
+OVERRIDE = json.dumps({'rules': [{'scope': 'string', 'foreground': 'var(red)'}]})
+
+
+def scores(index, scope):
+    """Get the selectors of the rules matching the scope, best first."""
+
+    return [rule.scope for score, rule in index.candidates(scope)]
+
+
+class TestSelectors(unittest.TestCase):
+    """Test scope selector matching and scoring."""
+
+    def match(self, selector, scope):
+        """Match a selector against a scope."""
+
+        return scheme_rules.parse_selector(selector).match(scheme_rules.scope_stack(scope))
+
+    def test_match(self):
+        """Test selector operators."""
+
+        scope = 'source.python meta.function-call.python variable.function.python'
+        self.assertIsNotNone(self.match('variable', scope))
+        self.assertIsNotNone(self.match('source meta.function-call variable', scope))
+        self.assertIsNone(self.match('variable source', scope))
+        self.assertIsNone(self.match('variable.func', scope))
+        self.assertIsNotNone(self.match('string, variable.function', scope))
+        self.assertIsNotNone(self.match('(string | variable) & source', scope))
+        self.assertIsNone(self.match('variable & string', scope))
+        self.assertIsNone(self.match('variable - meta.function-call', scope))
+        self.assertIsNotNone(self.match('variable -string', scope))
+        self.assertIsNone(self.match('-source', scope))
+
+    def test_score(self):
+        """Test that deeper and more specific matches score higher."""
+
+        scope = 'source.python string.quoted.double.python'
+        self.assertGreater(self.match('string.quoted', scope), self.match('string', scope))
+        self.assertGreater(self.match('string', scope), self.match('source.python', scope))
+        self.assertGreater(self.match('source string', scope), self.match('string', scope))
+
+
+class TestRuleIndex(unittest.TestCase):
+    """Test indexing and ranking color scheme rules."""
+
+    def test_candidates(self):
+        """Test that all matching rules are found and ranked."""
+
+        index = scheme_rules.RuleIndex(
+            [
+                ('Packages/Test/Test.sublime-color-scheme', SCHEME),
+                ('Packages/User/Test.sublime-color-scheme', OVERRIDE)
+            ]
+        )
+        self.assertEqual(
+            scores(index, 'source.python string.quoted.double.python'),
+            ['string.quoted.double', 'source.python string', 'string', 'string', '-comment']
+        )
+        self.assertEqual(
+            scores(index, 'source.python keyword.control.python')[0],
+            '(keyword | storage) & source.python'
+        )
+        self.assertEqual(
+            scores(index, 'source.python comment.line.python'),
+            ['comment, punctuation.definition.comment']
+        )
+        self.assertEqual(
+            scores(index, 'source.python string.quoted.single.python'),
+            ['source.python string', 'string', 'string - string.quoted.double', 'string', '-comment']
+        )
+
+        rules = [rule for score, rule in index.candidates('source.python string.quoted.single.python')]
+        strings = [rule for rule in rules if rule.scope == 'string']
+        self.assertEqual([rule.source.split('/')[1] for rule in strings], ['User', 'Test'])
+        self.assertEqual([rule.settings['foreground'] for rule in strings], ['#ff0000', '#ff0000'])
+
+
+class TestRulePopup(unittest.TestCase):
+    """Test listing the rules in the popup."""
+
+    def test_popup(self):
+        """Test that the matching rules are shown and the index is reused."""
+
+        import sublime
+
+        sublime.resources['Packages/Test/Test.sublime-color-scheme'] = SCHEME
+        try:
+            plugin = harness.load_plugin(dict(harness.ALL_INFO, scheme_rules=True))
+            view = harness.make_view(2000)
+            view.settings().set('color_scheme', 'Packages/Test/Test.sublime-color-scheme')
+            pt = view.find_by_selector('source.python string.quoted.double.python ')[0].begin()
+            view.selection = sublime.Selection([sublime.Region(pt)])
+            plugin.GetSelectionScope(plugin.get_session(view)).run(view)
+
+            html, on_navigate = view.popup
+            self.assertIn('`string.quoted.double`', html)
+            self.assertLess(html.index('`string.quoted.double`'), html.index('`source.python string`'))
+            on_navigate('copy-rules:0')
+            self.assertEqual(
+                sublime.get_clipboard().split('\n')[0],
+                'string.quoted.double (Packages/Test/Test.sublime-color-scheme #2)'
+            )
+
+            index = plugin.get_rule_index('Packages/Test/Test.sublime-color-scheme', [])
+            self.assertIs(plugin.get_rule_index('Packages/Test/Test.sublime-color-scheme', []), index)
+        finally:
+            del sublime.resources['Packages/Test/Test.sublime-color-scheme']
+
+    def test_scheme_name(self):
+        """Test that a color scheme set by file name is resolved once and isn't its own override."""
+
+        import sublime
+        from unittest import mock
+
+        base = 'Packages/Test/Test.sublime-color-scheme'
+        user = 'Packages/User/Test.sublime-color-scheme'
+        sublime.resources[base] = SCHEME
+        sublime.resources[user] = OVERRIDE
+        find_resources = sublime.find_resources
+        try:
+            plugin = harness.load_plugin(dict(harness.ALL_INFO, scheme_rules=True))
+            plugin.clear_scheme_cache()
+            view = harness.make_view(2000)
+            view.settings().set('color_scheme', 'Test.sublime-color-scheme')
+            pt = view.find_by_selector('source.python string.quoted.double.python ')[0].begin()
+            view.selection = sublime.Selection([sublime.Region(pt)])
+
+            with mock.patch.object(sublime, 'find_resources', side_effect=find_resources) as find:
+                plugin.GetSelectionScope(plugin.get_session(view)).run(view)
+                calls = find.call_count
+                plugin.GetSelectionScope(plugin.get_session(view)).run(view)
+                self.assertEqual(find.call_count, calls)
+
+            on_navigate = view.popup[1]
+            on_navigate('copy-rules:0')
+            rules = sublime.get_clipboard().split('\n')
+            self.assertEqual(len(rules), len(set(rules)))
+            self.assertIn('string.quoted.double (Packages/Test/Test.sublime-color-scheme #2)', rules)
+            on_navigate('copy-scheme:0')
+            self.assertEqual(sublime.get_clipboard(), base)
+            on_navigate('copy-overrides:0:0')
+            self.assertEqual(sublime.get_clipboard(), user)
+        finally:
+            del sublime.resources[base]
+            del sublime.resources[user]
+            plugin.clear_scheme_cache()
@@ -0,0 +1,100 @@
+"""Test the scope map cache."""
+import os
+import shutil
+import tempfile
+import unittest
+from .bench import harness
+
+scope_cache = harness.load_module('lib.scope_cache')
+
+
+class TestScopeCache(unittest.TestCase):
+    """Test storing, loading, and evicting scope maps."""
+
+    def setUp(self):
+        """Create a cache folder."""
+
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the cache folder."""
+
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        """Test that a stored scope map loads back unchanged."""
+
+        cache = scope_cache.ScopeMapCache(self.folder, 1024 * 1024)
+        extents = [(0, 4, 'source.python keyword.python '), (4, 9, 'source.python '), (9, 12, 'source.python ')]
+        key = scope_cache.make_key('Packages/Python/Python.sublime-syntax', 'a', scope_cache.content_hash('text'))
+
+        self.assertIsNone(cache.get(key))
+        cache.set(key, extents)
+        self.assertEqual(cache.get(key), extents)
+        self.assertIsNone(cache.get(scope_cache.make_key('Packages/Python/Python.sublime-syntax', 'b', 'c')))
+
+    def test_eviction(self):
+        """Test that the least recently used maps are evicted to stay within the size limit."""
+
+        extents = [(i, i + 1, 'source.python ') for i in range(100)]
+        cache = scope_cache.ScopeMapCache(self.folder, 1024 * 1024)
+        keys = ['{:040d}'.format(i) for i in range(4)]
+
+        for i, key in enumerate(keys[:3]):
+            cache.set(key, extents)
+            os.utime(cache.path(key), (i, i))
+        # Using the oldest entry makes it the most recently used
+        self.assertIsNotNone(cache.get(keys[0]))
+
+        size = os.path.getsize(cache.path(keys[0]))
+        cache.max_size = size * 2
+        cache.set(keys[3], extents)
+        self.assertEqual(
+            [os.path.exists(cache.path(key)) for key in keys],
+            [True, False, False, True]
+        )
+
+        cache.clear()
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+class TestScopeWalkCache(unittest.TestCase):
+    """Test that whole view scope walks use the cache."""
+
+    def test_walk_cache(self):
+        """Test that walking an unchanged view loads its scope map from the cache."""
+
+        import sublime
+
+        harness.load_plugin()
+        bulk = harness.load_module('scope_hunter_bulk')
+        syntax = 'Packages/Test/Test.sublime-syntax'
+        sublime.resources[syntax] = 'scope: source.test'
+        bulk.get_scope_cache(enabled_only=False).clear()
+
+        class CachedCollector(bulk.ScopeCollector):
+            use_cache = True
+            store_cache = True
+
+        view = harness.make_view(3000)
+        view.settings().set('syntax', syntax)
+        results = []
+        CachedCollector(view, lambda change_count, extents: results.append(extents)).start()
+
+        # Change the scopes without changing the syntax or content (like editing an extended syntax)
+        text, tokens = harness.make_tokens(3000)
+        view.set_tokens([(length, 'source.test ') for length, scope in tokens])
+        CachedCollector(view, lambda change_count, extents: results.append(extents)).start()
+        self.assertEqual(results[0], results[1])
+
+        # Snapshots and diffs never use the cache, so they see the changed scopes
+        bulk.ScopeCollector(view, lambda change_count, extents: results.append(extents)).start()
+        self.assertEqual(results[2], [(0, view.size(), 'source.test ')])
+
+        # A changed syntax is a cache miss
+        sublime.resources[syntax] = 'scope: source.test2'
+        CachedCollector(view, lambda change_count, extents: results.append(extents)).start()
+        self.assertEqual(results[3], [(0, view.size(), 'source.test ')])
+
+        bulk.get_scope_cache(enabled_only=False).clear()
+        del sublime.resources[syntax]
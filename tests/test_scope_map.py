@@ -0,0 +1,111 @@
+"""Test scope maps."""
+import unittest
+from .bench import harness
+
+scope_map = harness.load_module('lib.scope_map')
+
+
+class TestScopeMap(unittest.TestCase):
+    """Test scope map coalescing and formatting."""
+
+    def test_coalesce(self):
+        """Test that adjacent tokens with the same scope are merged."""
+
+        tokens = [(0, 2, 'a'), (2, 3, 'a'), (3, 5, 'b'), (5, 6, 'a'), (7, 8, 'a')]
+        self.assertEqual(
+            scope_map.coalesce(tokens),
+            [(0, 3, 'a'), (3, 5, 'b'), (5, 6, 'a'), (7, 8, 'a')]
+        )
+
+    def test_chunks(self):
+        """Test that feeding tokens in chunks gives the same extents."""
+
+        tokens = [(i, i + 1, 'ab'[(i // 3) % 2]) for i in range(20)]
+        coalescer = scope_map.Coalescer()
+        extents = []
+        for i in range(0, 20, 4):
+            extents.extend(coalescer.feed(tokens[i:i + 4]))
+        extents.extend(coalescer.flush())
+        self.assertEqual(extents, scope_map.coalesce(tokens))
+
+    def test_formats(self):
+        """Test the output formats."""
+
+        extent = (0, 4, 'source.python keyword.control.python ')
+        self.assertEqual(scope_map.format_tsv(extent), '0\t4\tsource.python keyword.control.python\n')
+        self.assertEqual(
+            scope_map.format_jsonl(extent),
+            '{"begin": 0, "end": 4, "scope": "source.python keyword.control.python"}\n'
+        )
+
+    def test_diff(self):
+        """Test that only the ranges whose scopes differ are reported."""
+
+        old = [(0, 4, 'a'), (4, 10, 'b'), (10, 12, 'c')]
+        new = [(0, 2, 'a'), (2, 6, 'x'), (6, 8, 'b'), (8, 12, 'c')]
+        self.assertEqual(
+            scope_map.diff(old, new),
+            [(2, 4, 'a', 'x'), (4, 6, 'b', 'x'), (8, 10, 'b', 'c')]
+        )
+        self.assertEqual(scope_map.diff(old, old), [])
+
+    def test_diff_merges_changes(self):
+        """Test that adjacent ranges with the same change are merged."""
+
+        old = [(0, 2, 'a'), (2, 3, 'b'), (3, 5, 'a')]
+        new = [(0, 5, 'a')]
+        self.assertEqual(scope_map.diff(old, new), [(2, 3, 'b', 'a')])
+        old = [(0, 3, 'a'), (3, 6, 'b')]
+        new = [(0, 1, 'x'), (1, 2, 'x'), (2, 6, 'b')]
+        self.assertEqual(scope_map.diff(old, new), [(0, 2, 'a', 'x'), (2, 3, 'a', 'b')])
+
+
+class TestScopeDump(unittest.TestCase):
+    """Test dumping the scopes of a whole view."""
+
+    def test_dump(self):
+        """Test that the dump covers the view in chunks and matches the view's extents."""
+
+        harness.load_plugin()
+        bulk = harness.load_module('scope_hunter_bulk')
+        view = harness.make_view(50000)
+        out = view.window().new_file()
+        bulk.ScopeDump(view, 'tsv', output=out).start()
+
+        lines = out.text.splitlines()
+        self.assertEqual(lines[0], 'begin\tend\tscope')
+        extents = [line.split('\t') for line in lines[1:]]
+        self.assertEqual(int(extents[0][0]), 0)
+        self.assertEqual(int(extents[-1][1]), view.size())
+        self.assertEqual(len(extents), len(view.starts))
+        self.assertTrue(view.rowcol(view.size())[0] > bulk.CHUNK_LINES)
+        self.assertEqual(bulk.walkers, {})
+
+
+class TestScopeDiff(unittest.TestCase):
+    """Test diffing the scopes of a view against a snapshot."""
+
+    def test_diff(self):
+        """Test that a scope change after a snapshot is highlighted and listed."""
+
+        import sublime
+
+        harness.load_plugin()
+        bulk = harness.load_module('scope_hunter_bulk')
+        view = harness.make_view(5000)
+        text, tokens = harness.make_tokens(5000)
+        bulk.ScopeHunterScopeSnapshotCommand(view).run(None)
+        self.assertIn(view.id(), bulk.snapshots)
+
+        index = len(tokens) // 2
+        start = sum(length for length, scope in tokens[:index])
+        tokens[index] = (tokens[index][0], 'source.python invalid.illegal.python ')
+        view.set_tokens(tokens)
+        bulk.ScopeHunterScopeDiffCommand(view).run(None)
+
+        self.assertEqual(view.get_regions(bulk.DIFF_KEY), [sublime.Region(start, start + tokens[index][0])])
+        self.assertIn('+ source.python invalid.illegal.python', view.window().panels[bulk.DIFF_PANEL].text)
+
+        bulk.ScopeHunterClearScopeDiffCommand(view).run(None)
+        self.assertEqual(view.get_regions(bulk.DIFF_KEY), [])
+        self.assertNotIn(view.id(), bulk.snapshots)
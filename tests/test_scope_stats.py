@@ -0,0 +1,88 @@
+"""Test scope statistics."""
+import os
+import shutil
+import tempfile
+import unittest
+from .bench import harness
+
+scope_stats = harness.load_module('lib.scope_stats')
+
+
+class TestScopeStats(unittest.TestCase):
+    """Test counting scopes."""
+
+    def test_counts(self):
+        """Test the counts per scope and per scope prefix."""
+
+        stats = scope_stats.ScopeStats()
+        stats.feed([(0, 4, 'source.python '), (4, 6, 'source.python string.quoted.double.python ')])
+        stats.feed([(6, 7, 'source.python string.quoted.single.python '), (7, 10, 'source.python ')])
+
+        self.assertEqual(stats.totals(), (10, 4))
+        self.assertEqual(
+            stats.by_scope(),
+            [
+                ('source.python', 7, 2),
+                ('source.python string.quoted.double.python', 2, 1),
+                ('source.python string.quoted.single.python', 1, 1)
+            ]
+        )
+        prefixes = dict((p, (c, e)) for p, c, e in stats.by_prefix())
+        self.assertEqual(prefixes['string'], (3, 2))
+        self.assertEqual(prefixes['string.quoted.double'], (2, 1))
+        self.assertEqual(prefixes['source.python'], (7, 2))
+
+    def test_prefixes(self):
+        """Test the prefixes of the innermost scope."""
+
+        self.assertEqual(
+            scope_stats.scope_prefixes('source.python string.quoted.python '),
+            ['string', 'string.quoted', 'string.quoted.python']
+        )
+        self.assertEqual(scope_stats.scope_prefixes(' '), [])
+
+
+class TestScopeStatsCommands(unittest.TestCase):
+    """Test the scope stats commands."""
+
+    def setUp(self):
+        """Load the plugin."""
+
+        harness.load_plugin()
+        self.bulk = harness.load_module('scope_hunter_bulk')
+
+    def test_view(self):
+        """Test the report of a view."""
+
+        view = harness.make_view(5000)
+        window = view.window()
+        self.bulk.ScopeHunterScopeStatsCommand(view).run(None)
+
+        report = window.active_view().text
+        self.assertTrue(report.startswith('Scope stats:'))
+        top, prefixes, unstyled = report.split('\n\n')[1:4]
+        self.assertIn('keyword.control.flow.python', top)
+        self.assertIn(' keyword\n', prefixes)
+        self.assertIn('default foreground (1)', unstyled)
+        self.assertTrue(unstyled.rstrip().endswith('  source.python'))
+
+    def test_folder(self):
+        """Test the report of the files of a folder."""
+
+        folder = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(folder, '.hidden'))
+            for name in ('a.py', 'b.py', 'c.txt', os.path.join('.hidden', 'd.py')):
+                with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+                    f.write('x = 1\ny = 2\n')
+
+            view = harness.make_view(100)
+            window = view.window()
+            self.bulk.ScopeHunterFolderScopeStatsCommand(window).run(folder)
+        finally:
+            shutil.rmtree(folder)
+
+        report = window.active_view().text
+        self.assertIn('Files: 2, characters: 24, extents: 2', report)
+        self.assertNotIn(self.bulk.STATS_PANEL, window.panels)
+        self.assertEqual(self.bulk.folder_stats, {})
@@ -7,6 +7,7 @@ Copyright (c) 2012-2015 Isaac Muse <isaacmuse@gmail.com>
 import re
 import codecs
 import json
+from bisect import bisect_right
 
 RE_LINE_PRESERVE = re.compile(r"\r?\n", re.MULTILINE)
 RE_COMMENT = re.compile(
@@ -93,25 +94,24 @@ class CheckJsonFormat(object):
         self.fail = False
 
     def index_lines(self, text):
-        """Index the char range of each line."""
+        """Index the start offset of each line."""
 
-        self.line_range = []
-        count = 1
-        last = 0
+        self.line_starts = [0]
         for m in re.finditer('\n', text):
-            self.line_range.append((last, m.end(0) - 1, count))
-            last = m.end(0)
-            count += 1
+            self.line_starts.append(m.end(0))
+        self.offsets = [0]
+        self.original = [0]
+
+    def map_offset(self, pt):
+        """Map an offset in the comment stripped text to the original text."""
+
+        i = bisect_right(self.offsets, pt) - 1
+        return self.original[i] + pt - self.offsets[i]
 
     def get_line(self, pt):
-        """Get the line from char index."""
+        """Get the line from char index in the original text."""
 
-        line = None
-        for r in self.line_range:
-            if pt >= r[0] and pt <= r[1]:
-                line = r[2]
-                break
-        return line
+        return bisect_right(self.line_starts, pt)
 
     def check_comments(self, text):
         """
@@ -123,19 +123,25 @@ class CheckJsonFormat(object):
         def remove_comments(group):
             return ''.join([x[0] for x in RE_LINE_PRESERVE.findall(group)])
 
-        def evaluate(m):
-            text = ''
+        # Offset of each kept run in the stripped text and in the original text
+        self.offsets = [0]
+        self.original = [0]
+        content = []
+        size = 0
+        for m in RE_COMMENT.finditer(text):
             g = m.groupdict()
             if g["code"] is None:
                 if not self.allow_comments:
                     self.log_failure(E_COMMENTS, self.get_line(m.start(0)))
-                text = remove_comments(g["comments"])
+                kept = remove_comments(g["comments"])
             else:
-                text = g["code"]
-            return text
-
-        content = ''.join(map(lambda m: evaluate(m), RE_COMMENT.finditer(text)))
-        return content
+                kept = g["code"]
+            if kept:
+                self.offsets.append(size)
+                self.original.append(m.start(0))
+                content.append(kept)
+                size += len(kept)
+        return ''.join(content)
 
     def check_dangling_commas(self, text):
         """
@@ -154,7 +160,7 @@ class CheckJsonFormat(object):
 
         def evaluate(m):
             g = m.groupdict()
-            return check_comma(g, m, self.get_line(m.start(0))) if g["code"] is None else g["code"]
+            return check_comma(g, m, self.get_line(self.map_offset(m.start(0)))) if g["code"] is None else g["code"]
 
         return ''.join(map(lambda m: evaluate(m), RE_TRAILING_COMMA.finditer(text)))
 
@@ -177,45 +183,44 @@ class CheckJsonFormat(object):
         self.fail = False
         comment_align = None
         with codecs.open(file_name, encoding='utf-8') as f:
-            count = 1
-            for line in f:
-                indent_match = (RE_LINE_INDENT_TAB if self.use_tabs else RE_LINE_INDENT_SPACE).match(line)
-                end_comment = (
-                    (comment_align is not None or (indent_match and indent_match.group(2))) and
-                    RE_COMMENT_END.search(line)
-                )
-                # Don't allow empty lines at file start.
-                if count == 1 and line.strip() == '':
-                    self.log_failure(W_NL_START, count)
-                # Line must end in new line
-                if not line.endswith('\n'):
-                    self.log_failure(W_NL_END, count)
-                # Trailing spaces
-                if RE_TRAILING_SPACES.match(line):
-                    self.log_failure(W_TRAILING_SPACE, count)
-                # Handle block comment content indentation
-                if comment_align is not None:
-                    if comment_align.match(line) is None:
-                        self.log_failure(W_COMMENT_INDENT, count)
-                    if end_comment:
-                        comment_align = None
-                # Handle general indentation
-                elif indent_match is None:
-                    self.log_failure(W_INDENT, count)
-                # Enter into block comment
-                elif comment_align is None and indent_match.group(2):
-                    alignment = indent_match.group(1) if indent_match.group(1) is not None else ""
-                    if not end_comment:
-                        comment_align = re.compile(
-                            (PATTERN_COMMENT_INDENT_TAB if self.use_tabs else PATTERN_COMMENT_INDENT_SPACE) % alignment
-                        )
-                count += 1
-            f.seek(0)
             text = f.read()
 
+        count = 1
+        for line in text.splitlines(True):
+            indent_match = (RE_LINE_INDENT_TAB if self.use_tabs else RE_LINE_INDENT_SPACE).match(line)
+            end_comment = (
+                (comment_align is not None or (indent_match and indent_match.group(2))) and
+                RE_COMMENT_END.search(line)
+            )
+            # Don't allow empty lines at file start.
+            if count == 1 and line.strip() == '':
+                self.log_failure(W_NL_START, count)
+            # Line must end in new line
+            if not line.endswith('\n'):
+                self.log_failure(W_NL_END, count)
+            # Trailing spaces
+            if RE_TRAILING_SPACES.match(line):
+                self.log_failure(W_TRAILING_SPACE, count)
+            # Handle block comment content indentation
+            if comment_align is not None:
+                if comment_align.match(line) is None:
+                    self.log_failure(W_COMMENT_INDENT, count)
+                if end_comment:
+                    comment_align = None
+            # Handle general indentation
+            elif indent_match is None:
+                self.log_failure(W_INDENT, count)
+            # Enter into block comment
+            elif comment_align is None and indent_match.group(2):
+                alignment = indent_match.group(1) if indent_match.group(1) is not None else ""
+                if not end_comment:
+                    comment_align = re.compile(
+                        (PATTERN_COMMENT_INDENT_TAB if self.use_tabs else PATTERN_COMMENT_INDENT_SPACE) % alignment
+                    )
+            count += 1
+
         self.index_lines(text)
         text = self.check_comments(text)
-        self.index_lines(text)
         text = self.check_dangling_commas(text)
         try:
             json.loads(text)
@@ -228,4 +233,9 @@ class CheckJsonFormat(object):
 if __name__ == "__main__":
     import sys
     cjf = CheckJsonFormat(False, True)
-    cjf.check_format(sys.argv[1])
+    fail = False
+    for file_name in sys.argv[1:]:
+        if cjf.check_format(file_name):
+            print("%s does not conform to expected format!" % file_name)
+            fail = True
+    sys.exit(1 if fail else 0)